@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from core.models import UserAlias
+from core.aliases import resolve_users
 
 
 class CustomTokenObtainPairSerializer(serializers.Serializer):
@@ -17,9 +17,8 @@ class CustomTokenObtainPairSerializer(serializers.Serializer):
         if not uwa_id:
             raise serializers.ValidationError("UWA ID is required")
 
-        try:
-            alias = UserAlias.objects.get(id=uwa_id)
-        except UserAlias.DoesNotExist:
+        user = resolve_users([uwa_id]).get(uwa_id)
+        if user is None:
             raise serializers.ValidationError("User with given UWA ID does not exist")
 
-        return {"user": alias.user}
+        return {"user": user}
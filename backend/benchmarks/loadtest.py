@@ -0,0 +1,489 @@
+"""
+Load test: replay a weighted admin traffic mix against a seeded local server.
+
+Usage (from backend/):
+    npm run bench:load
+    npm run bench:load -- --servers runserver:1,gunicorn:4,uvicorn:4 --duration 30
+
+For every server configuration this script
+  1. creates a fresh SQLite database (migrate + seed) in a temporary directory,
+  2. starts the server (`runserver` is always available; `gunicorn` for WSGI and
+     `uvicorn` for ASGI are used when installed),
+  3. runs --processes client processes, each with --concurrency asyncio virtual admins
+     that log in, refresh their token and replay the traffic mix for --duration seconds,
+  4. reports throughput, p50/p95/p99 latency, error rate and coalesced (single-flight
+     "shared") responses per route, plus the number of "database is locked" errors
+     (from responses and from the server log).
+
+Only the standard library is used on the client side.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HOST = "127.0.0.1"
+
+# Seeded admin (see core/signals.py)
+ADMIN_ID = "24301655"
+
+
+# ---------------------------------------------------------------------
+# Seeding (runs in a subprocess with Django set up)
+
+
+def seed(manifest_path, users, records_per_user):
+    import django
+
+    django.setup()
+
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from core.models import Training, TrainingRecord, User, UserAlias, UserGroup
+
+    rng = random.Random(42)
+    trainings = list(Training.objects.all())
+    groups = UserGroup.objects.bulk_create(
+        [UserGroup(name=f"Load Test Group {i}") for i in range(max(users // 100, 1))]
+    )
+    for i, training in enumerate(trainings):
+        training.groups.add(*rng.sample(groups, k=min(len(groups), 1 + i % 3)))
+
+    first_names = ["Alex", "Sam", "Jordan", "Taylor", "Casey", "Riley", "Morgan", "Jamie"]
+    last_names = ["Smith", "Nguyen", "Brown", "Wilson", "Taylor", "Lee", "Martin", "White"]
+    new_users = [
+        User(id=f"{30000000 + i}", name=f"{rng.choice(first_names)} {rng.choice(last_names)} {i}")
+        for i in range(users)
+    ]
+    User.objects.bulk_create(new_users)
+    UserAlias.objects.bulk_create([UserAlias(id=user.id, user=user) for user in new_users])
+
+    Membership = UserGroup.users.through
+    Membership.objects.bulk_create(
+        [Membership(usergroup_id=rng.choice(groups).id, user_id=user.id) for user in new_users],
+        ignore_conflicts=True,
+    )
+
+    now = timezone.now()
+    records = []
+    for user in new_users:
+        for training in rng.sample(trainings, k=min(records_per_user, len(trainings))):
+            details = {"score": rng.randint(50, 100)} if training.type == "LMS" else {}
+            timestamp = now - timedelta(days=rng.randint(0, 1500))
+            records.append(
+                TrainingRecord(user=user, training=training, timestamp=timestamp, details=details)
+            )
+    TrainingRecord.objects.bulk_create(records, batch_size=500)
+
+    manifest = {
+        "users": [user.id for user in new_users],
+        "user_names": {user.id: user.name for user in new_users},
+        "names": sorted({user.name.split()[0] for user in new_users}),
+        "trainings": [str(training.id) for training in trainings],
+        "lms_trainings": [str(t.id) for t in trainings if t.type == "LMS"],
+        "lms_records": [str(r.id) for r in records if r.training.type == "LMS"],
+    }
+    Path(manifest_path).write_text(json.dumps(manifest))
+
+
+def prepare_database(tmp, users, records_per_user):
+    db_path = Path(tmp) / "template.sqlite3"
+    manifest_path = Path(tmp) / "manifest.json"
+    env = {**os.environ, "DB_PATH": str(db_path), "DJANGO_SETTINGS_MODULE": "config.settings"}
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "-v0"], cwd=BACKEND_DIR, env=env, check=True
+    )
+    subprocess.run(
+        [sys.executable, __file__, "--seed", str(manifest_path), str(users), str(records_per_user)],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+    )
+    return db_path, json.loads(manifest_path.read_text())
+
+
+# ---------------------------------------------------------------------
+# Server
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def server_command(kind, workers, port):
+    if kind == "runserver":  # WSGI, one process, one thread per request
+        return [sys.executable, "manage.py", "runserver", f"{HOST}:{port}", "--noreload"]
+    if kind == "gunicorn":  # WSGI, pre-forked workers
+        return [
+            sys.executable, "-m", "gunicorn", "config.wsgi:application",
+            "--workers", str(workers), "--bind", f"{HOST}:{port}",
+        ]  # fmt: skip
+    if kind == "uvicorn":  # ASGI
+        return [
+            sys.executable, "-m", "uvicorn", "config.asgi:application",
+            "--workers", str(workers), "--host", HOST, "--port", str(port), "--no-access-log",
+        ]  # fmt: skip
+    raise ValueError(f"Unknown server: {kind}")
+
+
+def start_server(kind, workers, db_path, log_path, extra_env):
+    port = free_port()
+    env = {
+        **os.environ,
+        "DB_PATH": str(db_path),
+        "DJANGO_SETTINGS_MODULE": "config.settings",
+        **extra_env,
+    }
+    # The server writes to its own copy of the file descriptor, ours is closed right away
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            server_command(kind, workers, port), cwd=BACKEND_DIR, env=env, stdout=log, stderr=log
+        )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            tail = Path(log_path).read_text(errors="replace").strip().splitlines()[-1:]
+            raise RuntimeError(f"{kind} exited: {' '.join(tail)}")
+        try:
+            socket.create_connection((HOST, port), timeout=0.5).close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} did not start within 30s")
+
+
+# ---------------------------------------------------------------------
+# Minimal asyncio HTTP/1.1 client (keep-alive, Content-Length or chunked bodies)
+
+
+class HTTPClient:
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, body=b"", headers=None):
+        for attempt in range(2):  # retry once if the kept-alive connection was closed
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(HOST, self.port)
+            try:
+                return await self._send(method, path, body, headers or {})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _send(self, method, path, body, headers):
+        head = [f"{method} {path} HTTP/1.1", f"Host: {HOST}:{self.port}"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        head.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await self.reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            content = b""
+            while size := int((await self.reader.readuntil(b"\r\n")).strip(), 16):
+                content += await self.reader.readexactly(size + 2)
+                content = content[:-2]
+            await self.reader.readuntil(b"\r\n")
+        elif "content-length" in response_headers:
+            content = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            content = await self.reader.read()
+            await self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, content, response_headers
+
+
+# ---------------------------------------------------------------------
+# Virtual admin
+
+
+def multipart(fields, files):
+    boundary = f"loadtest{random.getrandbits(64):x}"
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content) in files.items():
+        parts.append(
+            (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{filename}"\r\nContent-Type: text/csv\r\n\r\n'
+            ).encode()
+            + content
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def traffic_mix(manifest, rng):
+    """(weight, route label, request factory) -- the factory returns (method, path, body, ctype)."""
+    users, names, trainings = manifest["users"], manifest["names"], manifest["trainings"]
+
+    def batch_upload():
+        training = rng.choice(manifest["lms_trainings"])
+        rows = ["UserID,Name,Completion Date,Score"]
+        for user_id in rng.sample(users, k=min(50, len(users))):
+            rows.append(
+                f"{user_id},{manifest['user_names'][user_id]},2025-0{rng.randint(1, 9)}-01,{rng.randint(50, 100)}"
+            )
+        body, ctype = multipart(
+            {"training": training}, {"file": ("upload.csv", "\n".join(rows).encode())}
+        )
+        return "POST", "/api/training-records/batch", body, ctype
+
+    def json_body(data):
+        return json.dumps(data).encode(), "application/json"
+
+    return [
+        (30, "GET /training-records", lambda: ("GET", f"/api/training-records?page={rng.randint(1, 20)}&page_size=50", b"", None)),
+        (10, "GET /training-records?user_id", lambda: ("GET", f"/api/training-records?user_id={rng.choice(users)[:6]}", b"", None)),
+        (15, "GET /users?name", lambda: ("GET", f"/api/users?name={rng.choice(names)}", b"", None)),
+        (15, "GET /users/{id}", lambda: ("GET", f"/api/users/{rng.choice(users)}", b"", None)),
+        (10, "GET /trainings/{id}/users", lambda: ("GET", f"/api/trainings/{rng.choice(trainings)}/users?page_size=50", b"", None)),
+        (5, "GET /trainings", lambda: ("GET", "/api/trainings", b"", None)),
+        (8, "PATCH /training-records/{id}", lambda: ("PATCH", f"/api/training-records/{rng.choice(manifest['lms_records'])}", *json_body({"details": {"score": rng.randint(50, 100)}}))),
+        (5, "PATCH /users/{id}", lambda: ("PATCH", f"/api/users/{rng.choice(users)}", *json_body({"role": "VIEWER"}))),
+        (2, "POST /training-records/batch", batch_upload),
+    ]  # fmt: skip
+
+
+async def virtual_admin(port, manifest, deadline, results, seed_value):
+    rng = random.Random(seed_value)
+    mix = traffic_mix(manifest, rng)
+    weights = [weight for weight, _, _ in mix]
+    client = HTTPClient(port)
+
+    async def timed(label, method, path, body=b"", ctype=None, token=None):
+        headers = {"Accept": "application/json"}
+        if ctype:
+            headers["Content-Type"] = ctype
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        start = time.perf_counter()
+        try:
+            status, content, response_headers = await client.request(method, path, body, headers)
+        except (OSError, asyncio.IncompleteReadError):
+            status, content, response_headers = 0, b"", {}
+        results["latency"][label].append(time.perf_counter() - start)
+        if status == 0 or status >= 400:
+            results["errors"][label] += 1
+        if response_headers.get("x-single-flight") == "shared":
+            results["shared"][label] += 1
+        if b"database is locked" in content:
+            results["locked"] += 1
+        return status, content
+
+    login = json.dumps({"uwa_id": ADMIN_ID}).encode()
+    status, content = await timed(
+        "POST /auth/login", "POST", "/api/auth/login", login, "application/json"
+    )
+    tokens = json.loads(content) if status == 200 else {}
+    refreshed_at = time.monotonic()
+
+    while time.monotonic() < deadline and tokens:
+        # Refresh like the frontend does (on 401, plus periodically here)
+        if time.monotonic() - refreshed_at > 60:
+            body = json.dumps({"refresh": tokens["refresh"]}).encode()
+            status, content = await timed(
+                "POST /auth/refresh", "POST", "/api/auth/refresh", body, "application/json"
+            )
+            if status == 200:
+                tokens["access"] = json.loads(content)["access"]
+            refreshed_at = time.monotonic()
+
+        _, label, factory = rng.choices(mix, weights=weights)[0]
+        method, path, body, ctype = factory()
+        await timed(label, method, path, body, ctype, tokens["access"])
+
+    await client.close()
+
+
+def client_process(port, manifest, duration, concurrency, index, queue):
+    results = {
+        "latency": defaultdict(list),
+        "errors": defaultdict(int),
+        "shared": defaultdict(int),
+        "locked": 0,
+    }
+    deadline = time.monotonic() + duration
+
+    async def main():
+        await asyncio.gather(
+            *(
+                virtual_admin(port, manifest, deadline, results, index * 1000 + i)
+                for i in range(concurrency)
+            )
+        )
+
+    asyncio.run(main())
+    queue.put(
+        {
+            "latency": dict(results["latency"]),
+            "errors": dict(results["errors"]),
+            "shared": dict(results["shared"]),
+            "locked": results["locked"],
+        }
+    )
+
+
+# ---------------------------------------------------------------------
+# Reporting
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def run_load(port, manifest, args):
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=client_process,
+            args=(port, manifest, args.duration, args.concurrency, i, queue),
+        )
+        for i in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    parts = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    latency, errors, shared, locked = defaultdict(list), defaultdict(int), defaultdict(int), 0
+    for part in parts:
+        for label, values in part["latency"].items():
+            latency[label] += values
+        for label, count in part["errors"].items():
+            errors[label] += count
+        for label, count in part["shared"].items():
+            shared[label] += count
+        locked += part["locked"]
+    return latency, errors, shared, locked, elapsed
+
+
+def report(name, latency, errors, shared, locked, server_locked, elapsed):
+    total = sum(len(values) for values in latency.values())
+    total_errors = sum(errors.values())
+    print(f"\n=== {name} ===")
+    print(
+        f"{'route':<34} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+        f"{'shared':>7}"
+    )
+    for label in sorted(latency):
+        values = latency[label]
+        print(
+            f"{label:<34} {len(values):>7} "
+            f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} "
+            f"{percentile(values, 99) * 1000:>8.1f} {errors.get(label, 0):>7} "
+            f"{shared.get(label, 0):>7}"
+        )
+    print(
+        f"throughput: {total / elapsed:.1f} req/s, error rate: {total_errors / max(total, 1):.2%}, "
+        f"SQLite lock errors: {locked} in responses, {server_locked} in server log"
+    )
+    return {
+        "name": name,
+        "rps": total / elapsed,
+        "p95": percentile([v for values in latency.values() for v in values], 95),
+        "error_rate": total_errors / max(total, 1),
+        "locked": max(locked, server_locked),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--servers",
+        default="runserver:1",
+        help="comma-separated server:workers, server in runserver|gunicorn|uvicorn",
+    )
+    parser.add_argument("--duration", type=float, default=20, help="seconds per server")
+    parser.add_argument("--processes", type=int, default=2, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual admins per process")
+    parser.add_argument("--users", type=int, default=2000, help="seeded users")
+    parser.add_argument("--records-per-user", type=int, default=5)
+    parser.add_argument(
+        "--env", action="append", default=[], help="KEY=VALUE for the server, e.g. WRITE_QUEUE=0"
+    )
+    args = parser.parse_args()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    summary = []
+    with tempfile.TemporaryDirectory() as tmp:
+        template, manifest = prepare_database(tmp, args.users, args.records_per_user)
+
+        for config in args.servers.split(","):
+            kind, _, workers = config.partition(":")
+            workers = int(workers or 1)
+            name = f"{kind} x{workers}"
+
+            db_path = Path(tmp) / f"{kind}-{workers}.sqlite3"
+            shutil.copy(template, db_path)
+            log_path = Path(tmp) / f"{kind}-{workers}.log"
+            try:
+                server, port = start_server(kind, workers, db_path, log_path, extra_env)
+            except RuntimeError as e:
+                print(f"\n=== {name} === skipped: {e}")
+                continue
+            try:
+                latency, errors, shared, locked, elapsed = run_load(port, manifest, args)
+            finally:
+                server.terminate()
+                server.wait()
+            server_locked = log_path.read_text(errors="replace").count("database is locked")
+            summary.append(report(name, latency, errors, shared, locked, server_locked, elapsed))
+
+    if len(summary) > 1:
+        print(f"\n{'server':<20} {'req/s':>8} {'p95 ms':>8} {'errors':>8} {'locked':>7}")
+        for row in summary:
+            print(
+                f"{row['name']:<20} {row['rps']:>8.1f} {row['p95'] * 1000:>8.1f} "
+                f"{row['error_rate']:>8.2%} {row['locked']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--seed":
+        sys.path.insert(0, str(BACKEND_DIR))
+        seed(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,106 @@
+"""
+Cold start benchmark: worker boot (import) time and `migrate` time.
+
+Usage (from backend/):
+    npm run py benchmarks/startup.py
+    npm run py benchmarks/startup.py -- --boot-budget 1.5 --migrate-budget 5
+
+Boot is measured with `python -X importtime` on a fresh interpreter that loads the
+WSGI application and resolves every URL pattern (which imports all views).
+Migrate is measured on an empty temporary SQLite database, twice: the first run
+creates the schema and seeds data, the second one should be (almost) a no-op.
+
+Exits with status 1 when a budget is exceeded or a deferred module is imported at boot.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Heavy modules that must only be imported on first use
+DEFERRED_MODULES = ["openpyxl"]
+
+BOOT_SCRIPT = (
+    "import config.wsgi; from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+
+def run(args, env=None):
+    start = time.perf_counter()
+    result = subprocess.run(
+        args,
+        cwd=BACKEND_DIR,
+        env={**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings", **(env or {})},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"Command failed: {' '.join(args)}\n{result.stderr}")
+    return elapsed, result
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into {top_level_package: seconds}, summing the
+    self time of every module of the package.
+    Lines look like: "import time:       123 |       4567 |   package.module"
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header line
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boot-budget", type=float, default=2.0, help="seconds")
+    parser.add_argument("--migrate-budget", type=float, default=10.0, help="seconds")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to show")
+    args = parser.parse_args()
+
+    failures = []
+
+    # ----- Boot -----
+    boot, result = run([sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT])
+    packages = parse_importtime(result.stderr)
+
+    print(f"Boot: {boot:.3f}s (budget {args.boot_budget:.3f}s)")
+    slowest = sorted(((v, k) for k, v in packages.items()), reverse=True)[: args.top]
+    for seconds, name in slowest:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    if boot > args.boot_budget:
+        failures.append(f"boot took {boot:.3f}s")
+    for name in DEFERRED_MODULES:
+        if name in packages:
+            failures.append(f"'{name}' is imported at boot, it should be deferred to first use")
+
+    # ----- Migrate -----
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"DB_PATH": str(Path(tmp) / "db.sqlite3")}
+        for label in ("fresh", "again"):
+            elapsed, _ = run([sys.executable, "manage.py", "migrate", "-v0"], env=env)
+            print(f"Migrate ({label}): {elapsed:.3f}s (budget {args.migrate_budget:.3f}s)")
+            if elapsed > args.migrate_budget:
+                failures.append(f"migrate ({label}) took {elapsed:.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
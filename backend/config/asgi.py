@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; lets sync views notice client disconnects
+from core.deadlines import DisconnectMiddleware  # noqa: E402
+
+application = DisconnectMiddleware(django_application)
@@ -3,6 +3,7 @@ Minimal Django settings for a pure API server using DRF + JWT.
 No admin, no sessions, no CSRF, no static files.
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.compression.CompressionMiddleware",
     "django.middleware.common.CommonMiddleware",
 ]
 
@@ -34,7 +36,8 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "core.renderers.FastJSONRenderer",
+        "core.renderers.ColumnarJSONRenderer",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -55,11 +58,54 @@ SIMPLE_JWT = {
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("DB_PATH", BASE_DIR / "db.sqlite3"),
+        "OPTIONS": {
+            # Take the write lock when a transaction starts, so concurrent writers wait
+            # (up to `timeout` seconds) instead of failing with "database is locked"
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+            # Readers no longer block the writer (and vice versa)
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+        },
     }
 }
 
+# Responses smaller than this (bytes) are not compressed
+COMPRESSION_MIN_SIZE = 1024
+
+# Serialise writes through one writer thread per process with group commit (core/writer.py)
+WRITE_QUEUE = os.environ.get("WRITE_QUEUE", "1") == "1"
+# Most jobs committed in one transaction
+WRITE_QUEUE_BATCH = 64
+# Seconds a request waits for its write to start before giving up with a 503
+WRITE_QUEUE_TIMEOUT = 30
+
+# Seconds the database work of a list request may take before it is cancelled with a 504
+# (core/deadlines.py, 0 == no deadline)
+QUERY_DEADLINE = float(os.environ.get("QUERY_DEADLINE", 15))
+
+# Record administrative mutations in the audit log, GET /audit (core/audit.py)
+AUDIT_LOG = os.environ.get("AUDIT_LOG", "1") == "1"
+# Most events buffered in memory before callers have to wait for the flusher
+AUDIT_BUFFER_SIZE = 50_000
+# Seconds a caller waits for room in a full buffer before its events are dropped
+AUDIT_BLOCK_TIMEOUT = 5
+# Seconds between two flushes of the buffer
+AUDIT_FLUSH_INTERVAL = 1
+# Most events written in one batch, one executemany() each (the buffer is also flushed as
+# soon as it holds this many)
+AUDIT_BATCH = 5000
+# Failed attempts at writing a batch before its events are discarded (stats["discarded"])
+AUDIT_FLUSH_RETRIES = 5
+
 AUTH_USER_MODEL = "core.User"
+
+# Rendered avatar cache
+AVATAR_CACHE_DIR = BASE_DIR / ".cache" / "avatars"
+
+# Processes used to parse multi-file imports (1 == parse in the request thread)
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", min(os.cpu_count() or 1, 4)))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # ---------------------------------------------------------------------
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import transaction
+
+from core.models import CacheVersion, User, UserAlias
+
+ALIASES_KEY = "aliases"
+# Bounded size and lifetime of cached entries
+MAX_ENTRIES = 50_000
+TTL = 300.0
+# How often (seconds) a worker checks whether another worker removed an alias
+CHECK_INTERVAL = 2.0
+
+
+class AliasResolver:
+    """
+    UWA ID (any alias) -> primary user ID, with a process-local LRU/TTL cache.
+
+    Only existing aliases are cached and an alias never moves to another user,
+    so creating aliases needs no invalidation. Deleting one bumps a version
+    stamp in the database (see signals.py); every worker compares it at most
+    once per CHECK_INTERVAL and clears its cache when it changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # alias_id -> (user_id, cached_at)
+        self._version = None
+        self._checked_at = 0.0
+
+    def _check_version(self, now):
+        if now - self._checked_at <= CHECK_INTERVAL:
+            return
+        version = CacheVersion.objects.filter(key=ALIASES_KEY).values_list("version", flat=True)
+        version = version.first()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        self._checked_at = now
+
+    def resolve(self, alias_id):
+        """Primary user ID of an alias, or None."""
+        return self.resolve_many([alias_id]).get(alias_id)
+
+    def resolve_many(self, alias_ids):
+        """{alias_id: user_id} for the aliases that exist; misses cost one query in total."""
+        found, missing = {}, set()
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_version(now)
+            for alias_id in alias_ids:
+                entry = self._entries.get(alias_id)
+                if entry and now - entry[1] < TTL:
+                    self._entries.move_to_end(alias_id)
+                    found[alias_id] = entry[0]
+                else:
+                    missing.add(alias_id)
+
+        if missing:
+            loaded = dict(UserAlias.objects.filter(id__in=missing).values_list("id", "user_id"))
+            found.update(loaded)
+            # Rows read inside a transaction may still be rolled back: cache them on commit
+            transaction.on_commit(lambda: self._remember(loaded, now))
+        return found
+
+    def _remember(self, mapping, now):
+        with self._lock:
+            for alias_id, user_id in mapping.items():
+                self._entries[alias_id] = (user_id, now)
+                self._entries.move_to_end(alias_id)
+            while len(self._entries) > MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+aliases = AliasResolver()
+
+
+def bump_aliases_version():
+    """Mark cached aliases as stale for every worker."""
+    CacheVersion.objects.bump(ALIASES_KEY)
+    transaction.on_commit(aliases.invalidate)
+
+
+def resolve_users(alias_ids):
+    """{alias_id: User} for the aliases that exist, in at most two queries."""
+    found = aliases.resolve_many(alias_ids)
+    users = User.objects.in_bulk(set(found.values()))
+    return {alias_id: users[user_id] for alias_id, user_id in found.items() if user_id in users}
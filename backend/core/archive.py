@@ -0,0 +1,95 @@
+"""
+Cold archive for stale training records.
+
+`manage.py archive_records` moves the records matching a policy from TrainingRecord to
+ArchivedTrainingRecord (details stored compressed), so the hot table that every list,
+filter and count scans stays small. List endpoints read the archive only when asked
+with ?include_archived=1; `manage.py restore_records` moves records back.
+"""
+
+import heapq
+from datetime import timedelta
+
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from core.catalog import catalog
+from core.models import ChangeLogEntry, TrainingRecord, User, UserGroup
+
+# Policy name -> function(value) returning a Q over TrainingRecord
+POLICIES = {}
+
+
+def policy(name):
+    def register(fn):
+        POLICIES[name] = fn
+        return fn
+
+    return register
+
+
+@policy("ungrouped")
+def ungrouped_q(months):
+    """
+    Records of users who are in no group, have had no membership change, no profile
+    change and no completed record for `months` months, e.g. departed staff.
+    Current membership is read from the membership table; membership changes from the
+    change feed, which also logs the memberships dropped by deleting a whole group.
+    """
+    cutoff = timezone.now() - timedelta(days=30 * months)
+    member = UserGroup.users.through.objects.filter(user_id=OuterRef("pk"))
+    recent = TrainingRecord.objects.filter(user_id=OuterRef("pk"), timestamp__gte=cutoff)
+    recently_changed = ChangeLogEntry.objects.filter(
+        model="group_users", timestamp__gte=cutoff
+    ).values("related_id")
+    users = User.objects.filter(~Exists(member), ~Exists(recent), updated_at__lt=cutoff).exclude(
+        id__in=recently_changed
+    )
+    return Q(user__in=users)
+
+
+@policy("expired")
+def expired_q(years):
+    """Records of expiring trainings that expired more than `years` years ago."""
+    now = timezone.now()
+    q = Q(pk__in=[])
+    for training in catalog.all().values():
+        if training.expiry > 0:
+            cutoff = now - timedelta(days=training.expiry + 365 * years)
+            q |= Q(training_id=training.id, timestamp__lt=cutoff)
+    return q
+
+
+def wants_archived(request):
+    return request.query_params.get("include_archived") in ("1", "true")
+
+
+class MergedRecords:
+    """
+    Live and archived records as one sorted sequence, for paginate_qs().
+
+    Both querysets are ordered on the same `order_by` field; a page is the merge of
+    the first `end` rows of each, so only the rows up to the requested page are read.
+    Archived rows come out as unsaved TrainingRecords (see ArchivedTrainingRecord.to_record).
+    """
+
+    def __init__(self, live, archived, order_by):
+        field = order_by.lstrip("-")
+        self.reverse = order_by.startswith("-")
+        ordering = ["-sort_key", "-id"] if self.reverse else ["sort_key", "id"]
+        self.live = live.annotate(sort_key=F(field)).order_by(*ordering)
+        self.archived = archived.annotate(sort_key=F(field)).order_by(*ordering)
+
+    def count(self):
+        return self.live.count() + self.archived.count()
+
+    def __getitem__(self, page):
+        assert isinstance(page, slice) and page.step is None
+        end = page.stop
+        rows = heapq.merge(
+            self.live[:end],
+            (archived.to_record() for archived in self.archived[:end]),
+            key=lambda record: (record.sort_key, record.id),
+            reverse=self.reverse,
+        )
+        return list(rows)[page]
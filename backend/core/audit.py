@@ -0,0 +1,171 @@
+"""
+Audit trail of administrative mutations (who changed what), see GET /audit.
+
+Views call audit.record() once their write has committed. Events are buffered in memory
+and written in bulk by a background thread, so a mutation never pays for its own audit
+row: every AUDIT_FLUSH_INTERVAL seconds, or as soon as AUDIT_BATCH events are waiting,
+the flusher writes everything buffered, AUDIT_BATCH events per writer job, each job one
+executemany() of a prepared INSERT (see AuditEventQuerySet.insert).
+
+The buffer holds at most AUDIT_BUFFER_SIZE events. When it is full, record() blocks
+(backpressure) until the flusher has made room, for up to AUDIT_BLOCK_TIMEOUT seconds;
+after that the events are dropped and counted in stats["dropped"]. A batch that fails
+AUDIT_FLUSH_RETRIES times in a row is discarded and counted in stats["discarded"], so
+one bad batch cannot block the buffer for good.
+"""
+
+import atexit
+import os
+import threading
+from collections import Counter, deque
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from itertools import islice
+from uuid import UUID
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from core.models import AuditEvent
+from core.writer import writer
+
+
+def _json(value):
+    """JSON-friendly copy of a field value (related objects become their IDs)."""
+    if isinstance(value, models.Model):
+        return _json(value.pk)
+    if isinstance(value, (list, tuple)):
+        return [_json(v) for v in value]
+    if isinstance(value, (set, models.QuerySet)):
+        return sorted((_json(v) for v in value), key=str)
+    if isinstance(value, dict):
+        return {str(k): _json(v) for k, v in value.items()}
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return value.astimezone(dt_timezone.utc).isoformat()  # comparable across time zones
+    if isinstance(value, (UUID, Decimal, date, datetime)):
+        return str(value)
+    return value
+
+
+def diff(instance, data):
+    """
+    {field: [before, after]} for the fields of validated serializer `data` that differ
+    from `instance`. Call it before saving.
+    """
+    changes = {}
+    for name, after in data.items():
+        field = instance._meta.get_field(name)
+        if field.many_to_many:
+            before = set(getattr(instance, name).all()) if instance.pk else set()
+            after = set(after)
+        else:
+            before = getattr(instance, field.attname if field.is_relation else name)
+        before, after = _json(before), _json(after)
+        if before != after:
+            changes[name] = [before, after]
+    return changes
+
+
+class AuditLog:
+    def __init__(self):
+        self.stats = Counter()
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._flushing = threading.Lock()
+        self._failures = 0  # consecutive failed writes of the oldest batch
+        self._pid = None
+        self._thread = None
+
+    def record(self, actor, action, model, object_ids, changes=None):
+        """
+        Buffer one event per object ID. `actor` is a User (the request user) or None.
+        Inside a transaction, the events are buffered only once it commits.
+        """
+        if not settings.AUDIT_LOG:
+            return
+        actor_id = getattr(actor, "pk", None)
+        events = [
+            AuditEvent(
+                actor=str(actor_id) if actor_id is not None else "",
+                action=action,
+                model=model,
+                object_id=str(object_id),
+                changes=_json(changes or {}),
+            )
+            for object_id in object_ids
+        ]
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._append(events))
+        else:
+            self._append(events)
+
+    def _append(self, events):
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self._start()
+        with self._room:
+            # Backpressure: wait for the flusher rather than growing without bound
+            has_room = self._room.wait_for(
+                lambda: len(self._buffer) + len(events) <= settings.AUDIT_BUFFER_SIZE,
+                timeout=settings.AUDIT_BLOCK_TIMEOUT,
+            )
+            if not has_room:
+                self.stats["dropped"] += len(events)
+                return
+            self._buffer.extend(events)
+            self.stats["recorded"] += len(events)
+            if len(self._buffer) >= settings.AUDIT_BATCH:
+                self._wakeup.set()
+
+    def _start(self):
+        # Threads do not survive fork(), so each (pre-forked) worker starts its own
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name="audit", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(settings.AUDIT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.stats["flush_errors"] += 1
+
+    def flush(self):
+        """Write everything buffered so far, AUDIT_BATCH events per writer job."""
+        with self._flushing:
+            while True:
+                with self._lock:
+                    events = list(islice(self._buffer, settings.AUDIT_BATCH))
+                if not events:
+                    return
+                # Events leave the buffer only once written, a failed flush is retried
+                try:
+                    writer.run(AuditEvent.objects.insert, events)
+                except Exception:
+                    self._failures += 1
+                    if self._failures < settings.AUDIT_FLUSH_RETRIES:
+                        raise
+                    self.stats["discarded"] += len(events)
+                else:
+                    self.stats["flushed"] += len(events)
+                    self.stats["flushes"] += 1
+                self._failures = 0
+                with self._room:
+                    for _ in events:
+                        self._buffer.popleft()
+                    self._room.notify_all()
+
+
+audit = AuditLog()
+
+
+@atexit.register
+def _flush_at_exit():
+    if audit._buffer and audit._pid == os.getpid():
+        audit.flush()
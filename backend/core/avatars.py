@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import os
+import threading
+from collections import Counter
+from html import escape
+
+from django.conf import settings
+
+# Background colours, picked deterministically from the name digest
+PALETTE = [
+    "#1abc9c",
+    "#2ecc71",
+    "#3498db",
+    "#9b59b6",
+    "#34495e",
+    "#16a085",
+    "#27ae60",
+    "#2980b9",
+    "#8e44ad",
+    "#e67e22",
+    "#e74c3c",
+    "#d35400",
+    "#c0392b",
+    "#7f8c8d",
+]
+
+
+def avatar_digest(name: str) -> str:
+    """
+    Content hash of an avatar. Keyed with SECRET_KEY, so the URL reveals nothing
+    about the name and only names of existing users can fill the on-disk cache.
+    """
+    return hmac.new(settings.SECRET_KEY.encode(), name.encode(), hashlib.sha256).hexdigest()[:20]
+
+
+def avatar_colour(digest: str) -> str:
+    return PALETTE[int(digest, 16) % len(PALETTE)]
+
+
+def avatar_url(name: str) -> str:
+    # The digest changes whenever the name changes, so the URL can be cached forever.
+    # It carries no personal data: the server looks the name up from the digest.
+    return f"/api/avatars/{avatar_digest(name)}.svg"
+
+
+class DigestIndex:
+    """
+    {avatar digest: name} of every user, kept per process. It is built once; after that
+    a miss only applies the user changes logged to the change feed since the last miss,
+    so made-up digests cost a primary-key lookup and a scan of the feed's newest entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._digests = {}  # user ID -> digest
+        self._users = Counter()  # digest -> users with that name
+        self._cursor = None
+
+    def _set(self, user_id, name):
+        old = self._digests.pop(user_id, None)
+        if old is not None:
+            self._users[old] -= 1
+            if not self._users[old]:
+                del self._users[old], self._names[old]
+        if name is not None:
+            digest = self._digests[user_id] = avatar_digest(name)
+            self._names[digest] = name
+            self._users[digest] += 1
+
+    def name(self, digest):
+        from core.models import ChangeLogEntry, User  # core.models imports this module
+
+        with self._lock:
+            if digest not in self._names:
+                cursor = ChangeLogEntry.objects.order_by("-id").values_list("id", flat=True)
+                cursor = cursor.first() or 0
+                if self._cursor is None:
+                    users = User.objects.values_list("id", "name").iterator()
+                else:
+                    changed = ChangeLogEntry.objects.filter(
+                        model="user", id__gt=self._cursor, id__lte=cursor
+                    ).values_list("object_id", flat=True)
+                    changed = set(changed)
+                    names = dict(User.objects.filter(id__in=changed).values_list("id", "name"))
+                    users = ((user_id, names.get(user_id)) for user_id in changed)  # None: deleted
+                for user_id, name in users:
+                    self._set(user_id, name)
+                self._cursor = cursor
+            return self._names.get(digest)
+
+
+digest_index = DigestIndex()
+
+
+def initials(name: str) -> str:
+    words = name.split()
+    if not words:
+        return "?"
+    if len(words) == 1:
+        return words[0][:2].upper()
+    return (words[0][0] + words[-1][0]).upper()
+
+
+def render_avatar_svg(name: str, colour: str) -> bytes:
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64" viewBox="0 0 64 64">'
+        f'<rect width="64" height="64" fill="{colour}"/>'
+        '<text x="50%" y="50%" dy=".1em" fill="#fff" font-family="Helvetica, Arial, sans-serif" '
+        'font-size="26" text-anchor="middle" dominant-baseline="middle">'
+        f"{escape(initials(name))}</text></svg>"
+    ).encode()
+
+
+def get_avatar(digest: str):
+    """
+    Return the SVG bytes for an avatar digest, rendering them to the on-disk cache
+    on first use. Returns None if no user's name has this digest.
+    """
+    if len(digest) != 20 or not all(c in "0123456789abcdef" for c in digest):
+        return None
+    path = settings.AVATAR_CACHE_DIR / f"{digest}.svg"
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    name = digest_index.name(digest)
+    if name is None:
+        return None
+    content = render_avatar_svg(name, avatar_colour(digest))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{digest}.{os.getpid()}.tmp")
+    tmp.write_bytes(content)
+    tmp.replace(path)  # atomic, concurrent workers never see a partial file
+    return content
@@ -0,0 +1,100 @@
+import threading
+import time
+from uuid import UUID
+
+from django.db import transaction
+
+from core.models import CacheVersion, Training
+
+CATALOG_KEY = "trainings"
+# How often (seconds) a worker checks whether another worker changed the catalog
+CHECK_INTERVAL = 2.0
+
+
+class TrainingCatalog:
+    """
+    Process-local copy of every Training (with `group_ids` attached).
+    Trainings are few and rarely change, so status computation and record
+    serialisation read them from here instead of joining or lazy-loading per row.
+
+    Writes bump a version stamp in the database (see signals.py); every worker
+    compares it at most once per CHECK_INTERVAL and reloads when it changed.
+    The worker that made the change drops its copy as soon as the change commits.
+    Cached instances are shared: read them, never modify or save them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trainings = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _current_version(self):
+        return (
+            CacheVersion.objects.filter(key=CATALOG_KEY).values_list("version", flat=True).first()
+        )
+
+    def _load(self):
+        version = self._current_version()
+        trainings = {training.id: training for training in Training.objects.all()}
+        for training in trainings.values():
+            training.group_ids = []
+        for training_id, group_id in Training.groups.through.objects.values_list(
+            "training_id", "usergroup_id"
+        ):
+            trainings[training_id].group_ids.append(group_id)
+        self._trainings, self._version = trainings, version
+
+    def all(self, check=False):
+        """
+        {training_id: Training}
+        check=True compares the version stamp now instead of waiting for CHECK_INTERVAL.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._trainings is None:
+                self._load()
+            elif check or now - self._checked_at > CHECK_INTERVAL:
+                if self._current_version() != self._version:
+                    self._load()
+            else:
+                return self._trainings
+            self._checked_at = now
+            return self._trainings
+
+    def get(self, training_id):
+        """The cached Training, or None for unknown / malformed IDs."""
+        return self.get_many([training_id])[0]
+
+    def get_many(self, training_ids):
+        """
+        Cached Trainings in the given order (None for unknown IDs).
+        A miss may be a training just created by another worker, so the
+        version stamp is checked once before giving up.
+        """
+        keys = []
+        for training_id in training_ids:
+            try:
+                keys.append(
+                    training_id if isinstance(training_id, UUID) else UUID(str(training_id))
+                )
+            except ValueError:
+                keys.append(None)
+
+        trainings = self.all()
+        if any(key not in trainings for key in keys if key is not None):
+            trainings = self.all(check=True)
+        return [trainings.get(key) for key in keys]
+
+    def invalidate(self):
+        with self._lock:
+            self._trainings = None
+
+
+catalog = TrainingCatalog()
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed for every worker."""
+    CacheVersion.objects.bump(CATALOG_KEY)
+    transaction.on_commit(catalog.invalidate)
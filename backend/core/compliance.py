@@ -0,0 +1,111 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.catalog import catalog
+from core.models import Training, TrainingRecord, User, UserGroup
+
+# Status codes used by the compact matrix encoding (index == code)
+STATUSES = ["PENDING", "PASSED", "FAILED", "EXPIRED"]
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+
+def status_rules(trainings, now=None):
+    """
+    Precompute, once per training, what TrainingRecord.status needs:
+    {training_id: (is_lms, passing_score, expired_before or None)}
+    """
+    now = now or timezone.now()
+    rules = {}
+    for training in trainings:
+        passing = training.config.get("completance_score") if training.type == "LMS" else None
+        expired_before = now - timedelta(days=training.expiry) if training.expiry > 0 else None
+        rules[training.id] = (training.type == "LMS", passing, expired_before)
+    return rules
+
+
+def record_status(rule, timestamp, details):
+    """Same result as TrainingRecord.status, from precomputed rules."""
+    is_lms, passing, expired_before = rule
+    if is_lms:
+        score = details.get("score")
+        if not isinstance(score, (int, float)) or passing is None or score < passing:
+            return "FAILED"
+    if expired_before is not None and timestamp < expired_before:
+        return "EXPIRED"
+    return "PASSED"
+
+
+def passed_q(rules):
+    """
+    Q matching the TrainingRecords whose status is PASSED, for the trainings in `rules`
+    (see status_rules), so pass counts can be aggregated in the database.
+    """
+    q = Q(pk__in=[])
+    for training_id, (is_lms, passing, expired_before) in rules.items():
+        condition = Q(training_id=training_id)
+        if is_lms:
+            if passing is None:
+                continue  # nobody can pass
+            condition &= Q(details__score__gte=passing)
+        if expired_before is not None:
+            condition &= Q(timestamp__gte=expired_before)
+        q |= condition
+    return q
+
+
+def compliance_matrix(users):
+    """
+    Status of every (user, assigned training) pair, in a fixed number of queries:
+    one for assignments and one for records (trainings come from the catalog).
+
+    `users` is a list of user IDs or a User queryset (used as a subquery).
+    Returns (trainings, cells): trainings ordered by name, and
+    cells == {(user_id, training_id): status} for assigned pairs only.
+    """
+    # Training <-> group <-> user, resolved in the database
+    assignments = set(
+        Training.groups.through.objects.filter(usergroup__users__in=users)
+        .values_list("usergroup__users", "training_id")
+        .distinct()
+    )
+    trainings = catalog.get_many({training_id for _, training_id in assignments})
+    # None: deleted since the assignments were read, drop its pairs
+    trainings = sorted(filter(None, trainings), key=lambda training: training.name)
+    training_ids = {training.id for training in trainings}
+    assignments = {pair for pair in assignments if pair[1] in training_ids}
+    rules = status_rules(trainings)
+
+    cells = dict.fromkeys(assignments, "PENDING")
+    records = TrainingRecord.objects.filter(
+        user__in=users, training_id__in=training_ids
+    ).values_list("user_id", "training_id", "timestamp", "details")
+    for user_id, training_id, timestamp, details in records:
+        if (user_id, training_id) in cells:
+            cells[user_id, training_id] = record_status(rules[training_id], timestamp, details)
+
+    return trainings, cells
+
+
+def snapshot_counts():
+    """
+    Current status counts for ComplianceSnapshot:
+    Counter({(training_id, group_id or None, status code): count}).
+    Group rows count each member, the None row counts each assigned user once.
+    """
+    _, cells = compliance_matrix(User.objects.all())
+    counts = Counter()
+    for (_, training_id), status in cells.items():
+        counts[training_id, None, STATUS_CODES[status]] += 1
+
+    members = defaultdict(list)
+    for group_id, user_id in UserGroup.users.through.objects.values_list("usergroup_id", "user_id"):
+        members[group_id].append(user_id)
+    for group_id, training_id in Training.groups.through.objects.values_list(
+        "usergroup_id", "training_id"
+    ):
+        for user_id in members[group_id]:
+            counts[training_id, group_id, STATUS_CODES[cells[user_id, training_id]]] += 1
+    return counts
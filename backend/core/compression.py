@@ -0,0 +1,206 @@
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Per encoding: "<enc>.responses", "<enc>.bytes_in", "<enc>.bytes_out", "<enc>.cpu_ns"
+stats = Counter()
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+# ---------------------------------------------------------------------
+# Compressors: compress(data) returns what can be sent so far (flushed), finish() the rest
+
+
+class GzipCompressor:
+    def __init__(self):
+        self._obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._obj = brotli.Compressor(quality=4)  # fast enough for dynamic responses
+
+    def compress(self, data):
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class ZstdCompressor:
+    def __init__(self):
+        self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+# Server preference, best first
+COMPRESSORS = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS = {"br": BrotliCompressor, **COMPRESSORS}
+if zstandard is not None:
+    COMPRESSORS = {"zstd": ZstdCompressor, **COMPRESSORS}
+
+
+def negotiate(accept_encoding):
+    """Best encoding we support that the client accepts (q > 0), or None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+
+    candidates = [
+        (accepted.get(enc, accepted.get("*", 0.0)), -rank, enc)
+        for rank, enc in enumerate(COMPRESSORS)
+    ]
+    q, _, enc = max(candidates)
+    return enc if q > 0 else None
+
+
+# ---------------------------------------------------------------------
+# Middleware
+
+
+class _Meter:
+    """Accumulates bytes and CPU time of one response and reports them to `stats`."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.bytes_in = self.bytes_out = self.cpu_ns = 0
+
+    def run(self, fn, data=None):
+        start = time.thread_time_ns()
+        out = fn() if data is None else fn(data)
+        self.cpu_ns += time.thread_time_ns() - start
+        self.bytes_in += len(data or b"")
+        self.bytes_out += len(out)
+        return out
+
+    def report(self):
+        enc = self.encoding
+        stats[f"{enc}.responses"] += 1
+        stats[f"{enc}.bytes_in"] += self.bytes_in
+        stats[f"{enc}.bytes_out"] += self.bytes_out
+        stats[f"{enc}.cpu_ns"] += self.cpu_ns
+
+    def server_timing(self):
+        ratio = self.bytes_in / max(self.bytes_out, 1)
+        return f'compress;dur={self.cpu_ns / 1e6:.2f};desc="{self.encoding} {ratio:.1f}x"'
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with zstd, br or gzip (whichever the client accepts, in that order;
+    zstd and br need the optional `zstandard` / `brotli` packages).
+
+    Regular responses below COMPRESSION_MIN_SIZE bytes are sent as-is. Streaming responses
+    are compressed chunk by chunk and flushed after every chunk, never buffered.
+    Ratio and CPU time go to `stats`, and to a Server-Timing header for regular responses.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        content_type = response.get("Content-Type", "")
+        if (
+            response.has_header("Content-Encoding")
+            or response.status_code in (204, 206, 304)
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+        compressor = COMPRESSORS[encoding]()
+        meter = _Meter(encoding)
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(
+                    response.streaming_content, compressor, meter
+                )
+            else:
+                response.streaming_content = self._compress_stream(
+                    response.streaming_content, compressor, meter
+                )
+            del response["Content-Length"]
+        else:
+            content = meter.run(compressor.compress, response.content)
+            content += meter.run(compressor.finish)
+            if len(content) >= len(response.content):
+                return response  # not worth it
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+            timing = response.get("Server-Timing")
+            entry = meter.server_timing()
+            response.headers["Server-Timing"] = f"{timing}, {entry}" if timing else entry
+            meter.report()
+
+        # The compressed representation is not byte-identical to the original
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _compress_stream(chunks, compressor, meter):
+        for chunk in chunks:
+            if chunk:
+                yield meter.run(compressor.compress, chunk)
+        yield meter.run(compressor.finish)
+        meter.report()
+
+    @staticmethod
+    async def _compress_async(chunks, compressor, meter):
+        async for chunk in chunks:
+            if chunk:
+                yield meter.run(compressor.compress, chunk)
+        yield meter.run(compressor.finish)
+        meter.report()
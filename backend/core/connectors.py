@@ -0,0 +1,235 @@
+"""
+Connectors pull training records from external systems (LMS, TryBooking, ...).
+
+A training is synced when its config has a "sync" object, e.g.
+    {"completance_score": 80, "sync": {"url": "https://lms.example/api/completions/123"}}
+The connector is picked by Training.type; {"sync": {"source": "fake", "path": ...}} uses
+the local fake source instead, for development and tests.
+
+Each run asks the source only for records after the stored SyncWatermark cursor and
+upserts them in bulk, so its cost grows with the number of changes, not with history.
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.aliases import resolve_users
+from core.catalog import catalog
+from core.imports import bulk_record
+from core.models import SyncWatermark, TrainingRecord
+
+CONNECTORS = {}
+
+# Most skipped items kept for retry per training (the oldest are given up first)
+MAX_PENDING = 10_000
+
+
+def register(cls):
+    CONNECTORS[cls.type] = cls
+    return cls
+
+
+class Connector(ABC):
+    """
+    Base class. Subclasses set `type` (a Training.type) and implement fetch().
+    """
+
+    type = None
+    # Trainings of this type synced at the same time (external API rate limits)
+    max_concurrency = 2
+
+    def __init__(self, training):
+        self.training = training
+        self.config = training.config.get("sync") or {}
+
+    @abstractmethod
+    def fetch(self, since):
+        """
+        Records after the `since` cursor ("" == from the beginning).
+        Returns (items, cursor): items are {"user", "timestamp", "details"} dicts and
+        cursor is the new watermark. Runs in a worker thread, must not use the database.
+        """
+
+
+class HTTPFeedConnector(Connector):
+    """
+    JSON feed: GET <url>?since=<cursor> returns {"items": [...], "cursor": "..."}.
+    An optional bearer token is read from the environment variable named by "token_env".
+    """
+
+    timeout = 30
+
+    def fetch(self, since):
+        url = self.config["url"]
+        if since:
+            url += ("&" if "?" in url else "?") + urlencode({"since": since})
+        headers = {"Accept": "application/json"}
+        if self.config.get("token_env"):
+            headers["Authorization"] = f"Bearer {os.environ[self.config['token_env']]}"
+
+        with urlopen(Request(url, headers=headers), timeout=self.timeout) as response:
+            data = json.load(response)
+        return [self.to_item(item) for item in data["items"]], data.get("cursor") or since
+
+    def to_item(self, item):
+        return {"user": item["user"], "timestamp": item["timestamp"], "details": {}}
+
+
+@register
+class LMSConnector(HTTPFeedConnector):
+    type = "LMS"
+
+    def to_item(self, item):
+        return {**super().to_item(item), "details": {"score": item.get("score")}}
+
+
+@register
+class TryBookingConnector(HTTPFeedConnector):
+    type = "TRYBOOKING"
+    max_concurrency = 1  # TryBooking rate-limits per account
+
+    def to_item(self, item):
+        details = {"booking": item["booking"]} if item.get("booking") else {}
+        return {**super().to_item(item), "details": details}
+
+
+class FakeConnector(Connector):
+    """
+    Local stand-in for any source: an NDJSON file of
+    {"cursor": <int>, "user": ..., "timestamp": ..., "details": {...}} lines, appended in
+    cursor order. Append lines and re-run the sync to simulate new completions.
+    """
+
+    type = "FAKE"
+
+    def fetch(self, since):
+        since = int(since or 0)
+        items = []
+        with open(self.config["path"]) as file:
+            for line in file:
+                if line.strip():
+                    item = json.loads(line)
+                    if item["cursor"] > since:
+                        items.append(item)
+        cursor = max((item["cursor"] for item in items), default=since)
+        return items, str(cursor)
+
+
+def connector_for(training):
+    """Connector instance for a training, or None if it is not synced."""
+    config = training.config.get("sync")
+    if not isinstance(config, dict):
+        return None
+    cls = FakeConnector if config.get("source") == "fake" else CONNECTORS.get(training.type)
+    return cls(training) if cls else None
+
+
+def save_items(training, items, cursor, pending=()):
+    """
+    Upsert fetched items, plus the `pending` items of earlier runs, and move the
+    watermark, in one transaction.
+    The cursor moves past every fetched item, so items whose user does not exist yet
+    are kept in SyncWatermark.pending and retried next run; items with invalid data
+    are dropped. Both are counted, with their reasons, in SyncWatermark.error.
+    Returns (written, skipped).
+    """
+    records, retry, reasons = [], [], Counter()
+    items = [*pending, *items]
+    users = resolve_users({str(item.get("user")) for item in items})
+    for item in items:
+        try:
+            user_id, record = bulk_record(
+                {**item, "user": str(item.get("user")), "training": str(training.id)}
+            )
+        except ValueError as e:
+            reasons[str(e)] += 1
+            continue
+        if user_id not in users:
+            reasons["User not found, retried next run."] += 1
+            retry.append(item)
+            continue
+        record.user = users[user_id]
+        records.append(record)
+
+    if len(retry) > MAX_PENDING:
+        reasons[f"Gave up on the oldest items, at most {MAX_PENDING} are retried."] += 1
+        retry = retry[-MAX_PENDING:]
+    error = "; ".join(f"{count} skipped: {reason}" for reason, count in reasons.items())
+
+    with transaction.atomic():
+        written = TrainingRecord.objects.upsert_latest(records) if records else {}
+        SyncWatermark.objects.update_or_create(
+            training_id=training.id,
+            defaults={
+                "cursor": cursor,
+                "synced_at": timezone.now(),
+                "error": error,
+                "pending": retry,
+            },
+        )
+    return len(written), len(items) - len(records)
+
+
+def sync(trainings=None, types=None, log=print):
+    """
+    Run the connector of every synced training (optionally only these trainings / types).
+    Fetches run in parallel, at most `max_concurrency` per connector type; database writes
+    happen in the calling thread, one transaction per training.
+    Returns {training_id: error message} for the trainings that failed.
+    """
+    connectors = []
+    for training in catalog.all(check=True).values():
+        if trainings and str(training.id) not in trainings and training.name not in trainings:
+            continue
+        connector = connector_for(training)
+        if connector and (not types or connector.type in types):
+            connectors.append(connector)
+
+    watermarks = {
+        watermark.training_id: watermark
+        for watermark in SyncWatermark.objects.filter(
+            training__in=[c.training.id for c in connectors]
+        )
+    }
+    limits = {
+        cls.type: threading.BoundedSemaphore(cls.max_concurrency)
+        for cls in {type(c) for c in connectors}
+    }
+
+    def fetch(connector):
+        watermark = watermarks.get(connector.training.id)
+        with limits[connector.type]:
+            return connector.fetch(watermark.cursor if watermark else "")
+
+    errors = {}
+    workers = sum(cls.max_concurrency for cls in {type(c) for c in connectors}) or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, connector): connector for connector in connectors}
+        for future in as_completed(futures):
+            training = futures[future].training
+            try:
+                items, cursor = future.result()
+                watermark = watermarks.get(training.id)
+                pending = watermark.pending if watermark else []
+                written, skipped = save_items(training, items, cursor, pending)
+            except Exception as e:
+                errors[training.id] = f"{type(e).__name__}: {e}"
+                SyncWatermark.objects.update_or_create(
+                    training_id=training.id, defaults={"error": errors[training.id]}
+                )
+                log(f"{training.name}: failed, {errors[training.id]}")
+                continue
+            log(
+                f"{training.name}: {len(items)} fetched, {written} written, "
+                f"{skipped} skipped, cursor {cursor!r}"
+            )
+    return errors
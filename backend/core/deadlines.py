@@ -0,0 +1,159 @@
+"""
+Query deadlines: stop the database work of a request that takes too long, or whose
+client has disconnected, instead of letting it run to completion for nobody.
+
+- SQLite: a progress handler aborts the running statement (checked every few thousand
+  VM instructions), so even a single runaway query is interrupted.
+- PostgreSQL / MySQL: the session statement timeout is set to the deadline.
+- All backends: the deadline and the disconnect flag are checked before every query.
+
+Client disconnects are only seen under ASGI, see DisconnectMiddleware (config/asgi.py).
+"""
+
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from rest_framework.exceptions import APIException
+
+# "timeouts": deadlines hit, "disconnects": requests cancelled because the client left
+stats = Counter()
+
+# SQLite VM instructions between two checks of the progress handler
+PROGRESS_STEPS = 10_000
+
+
+class QueryDeadlineExceeded(APIException):
+    status_code = 504
+    default_detail = "The query took too long and was cancelled."
+    default_code = "query_deadline"
+
+
+class ClientDisconnected(APIException):
+    status_code = 503
+    default_detail = "The client disconnected, the request was cancelled."
+    default_code = "client_disconnected"
+
+
+class _Deadline:
+    def __init__(self, seconds, disconnected):
+        self.seconds = seconds
+        self.start = time.monotonic()
+        self.end = self.start + seconds
+        self.disconnected = disconnected or threading.Event()
+
+    def expired(self):
+        return self.disconnected.is_set() or time.monotonic() >= self.end
+
+    def error(self):
+        elapsed = time.monotonic() - self.start
+        if self.disconnected.is_set():
+            stats["disconnects"] += 1
+            return ClientDisconnected(
+                f"The client disconnected, the request was cancelled after {elapsed:.2f}s."
+            )
+        stats["timeouts"] += 1
+        return QueryDeadlineExceeded(
+            f"Query deadline of {self.seconds:g}s exceeded after {elapsed:.2f}s, "
+            "narrow down the filters and try again."
+        )
+
+    # connection.execute_wrapper()
+    def __call__(self, execute, sql, params, many, context):
+        if self.expired():
+            raise self.error()
+        return execute(sql, params, many, context)
+
+
+def _statement_timeout_sql(vendor, ms):
+    if vendor == "postgresql":
+        return f"SET statement_timeout = {ms}", "SET statement_timeout = DEFAULT"
+    if vendor == "mysql":
+        return f"SET SESSION max_execution_time = {ms}", "SET SESSION max_execution_time = DEFAULT"
+    return None, None
+
+
+@contextmanager
+def deadline(seconds, disconnected=None):
+    """
+    Cancel the queries run in this block after `seconds`, or as soon as the
+    `disconnected` event is set. Raises QueryDeadlineExceeded (504) or ClientDisconnected (503).
+    """
+    state = _Deadline(seconds, disconnected)
+    connection.ensure_connection()
+    vendor = connection.vendor
+    if vendor == "sqlite":
+        connection.connection.set_progress_handler(state.expired, PROGRESS_STEPS)
+        reset = None
+    else:
+        set_timeout, reset = _statement_timeout_sql(vendor, max(int(seconds * 1000), 1))
+        if set_timeout:
+            with connection.cursor() as cursor:
+                cursor.execute(set_timeout)
+
+    try:
+        with connection.execute_wrapper(state):
+            yield
+    except OperationalError:
+        # "interrupted" (SQLite), "canceling statement due to statement timeout" (PostgreSQL), ...
+        if state.expired():
+            raise state.error()
+        raise
+    finally:
+        if vendor == "sqlite":
+            if connection.connection is not None:
+                connection.connection.set_progress_handler(None, 0)
+        elif reset and connection.connection is not None:
+            with connection.cursor() as cursor:
+                cursor.execute(reset)
+
+
+def query_deadline(seconds=None):
+    """
+    Apply a query deadline to a (DRF) view method, QUERY_DEADLINE seconds by default.
+    Under ASGI the request is also cancelled when the client disconnects.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            limit = seconds or settings.QUERY_DEADLINE
+            if not limit:
+                return view_method(self, request, *args, **kwargs)
+            scope = getattr(request._request, "scope", {})
+            with deadline(limit, scope.get("disconnected")):
+                return view_method(self, request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class DisconnectMiddleware:
+    """
+    ASGI middleware: sets scope["disconnected"] (a threading.Event) when the client
+    goes away, so the sync view running in a worker thread can stop (see deadline()).
+    Django itself listens for the disconnect once the body has been read; this only
+    watches the messages it receives.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        disconnected = threading.Event()
+
+        async def watched_receive():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            return message
+
+        return await self.app({**scope, "disconnected": disconnected}, watched_receive, send)
@@ -0,0 +1,221 @@
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+
+from core.catalog import catalog
+from core.models import TrainingRecord
+from core.utils import (
+    COMPLETEION_DATE_COL,
+    NAME_COL,
+    SCORE_COL,
+    UID_COL,
+    cell_to_aware_datetime,
+    cell_to_int,
+    column_str,
+    parse_to_aware_datetime,
+    read_csv_columns,
+    read_xlsx_columns,
+)
+
+READERS = {".csv": read_csv_columns, ".xlsx": read_xlsx_columns}
+MANIFEST_NAME = "manifest.json"
+# Refuse archives that would expand beyond this (zip bombs)
+MAX_UNCOMPRESSED_BYTES = 200 * 1024 * 1024
+
+# POST /training-records/bulk
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/jsonl"}
+MAX_BULK_ITEMS = 50_000
+# Read from the stream, so DATA_UPLOAD_MAX_MEMORY_SIZE does not apply
+MAX_BULK_BYTES = 64 * 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+def expected_columns(training_type):
+    if training_type == "LMS":
+        return [UID_COL, NAME_COL, COMPLETEION_DATE_COL, SCORE_COL]
+    return [UID_COL, NAME_COL, COMPLETEION_DATE_COL, COMPLETEION_DATE_COL]
+
+
+def parse_rows(name, content, training_type):
+    """
+    Parse and validate one uploaded file without touching the database,
+    so it can run in a worker process.
+    Returns (rows, error) where rows are (row_idx, user_id, name, timestamp, details).
+    """
+    cols = expected_columns(training_type)
+    try:
+        read = READERS[PurePosixPath(name).suffix.lower()]
+        row_idxs, (user_ids, names, dates, scores) = read(BytesIO(content), cols)
+    except Exception:
+        return None, (
+            f"Failed to parse uploaded file. File must include all expected columns: {cols}."
+        )
+
+    # Convert whole columns at once; native cells (datetime, int) need no parsing
+    timestamps = list(map(cell_to_aware_datetime, dates))
+    bad_date = timestamps.index(None) if None in timestamps else len(row_idxs)
+    if training_type == "LMS":
+        scores = list(map(cell_to_int, scores))
+        bad_score = scores.index(None) if None in scores else len(row_idxs)
+        if bad_score < bad_date:
+            return None, f"Row {row_idxs[bad_score]}: Invalid score value"
+        details = [{"score": score} for score in scores]
+    else:
+        details = [{} for _ in row_idxs]
+    if bad_date < len(row_idxs):
+        return None, f"Row {row_idxs[bad_date]}: Invalid date"
+
+    return list(zip(row_idxs, column_str(user_ids), column_str(names), timestamps, details)), None
+
+
+# ---------------------------------------------------------------------
+# Process pool
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked
+    import django
+
+    django.setup()
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMPORT_WORKERS, initializer=_init_worker)
+    return _pool
+
+
+def parse_many(files):
+    """
+    parse_rows() for every (name, content, training_type), in parallel when there is
+    more than one file. Results are returned in input order.
+    """
+    global _pool
+    if len(files) < 2 or settings.IMPORT_WORKERS < 2:
+        return [parse_rows(*file) for file in files]
+    try:
+        return list(_get_pool().map(parse_rows, *zip(*files)))
+    except BrokenProcessPool:  # a worker died (e.g. OOM), retry in this process
+        _pool = None
+        return [parse_rows(*file) for file in files]
+
+
+# ---------------------------------------------------------------------
+# Uploads
+
+
+def collect_files(uploads):
+    """
+    Flatten uploaded files and ZIP archives into [(name, content)].
+    A `manifest.json` found among them is returned separately.
+    Raises UploadError on an unreadable or oversized archive, or an unsupported file.
+    """
+    files, manifest = [], None
+
+    def add(name, content):
+        nonlocal manifest
+        base = PurePosixPath(name).name
+        if base.lower() == MANIFEST_NAME:
+            manifest = content
+        elif PurePosixPath(base).suffix.lower() in READERS:
+            files.append((base, content))
+        else:
+            raise UploadError(f"{base}: Please upload .csv, .xlsx or .zip files")
+
+    for upload in uploads:
+        if not upload.name.lower().endswith(".zip"):
+            add(upload.name, upload.read())
+            continue
+        try:
+            with zipfile.ZipFile(upload) as archive:
+                entries = [
+                    info
+                    for info in archive.infolist()
+                    if not info.is_dir()
+                    and not info.filename.startswith("__MACOSX/")
+                    and not PurePosixPath(info.filename).name.startswith(".")
+                ]
+                if sum(info.file_size for info in entries) > MAX_UNCOMPRESSED_BYTES:
+                    raise UploadError(f"{upload.name}: Archive is too large")
+                for info in entries:
+                    add(info.filename, archive.read(info))
+        except zipfile.BadZipFile:
+            raise UploadError(f"{upload.name}: Not a valid ZIP archive")
+
+    return files, manifest
+
+
+def parse_manifest(raw):
+    """
+    Manifest: {"<file name>": "<training id or name>", ...}
+    Raises UploadError if it is not such an object.
+    """
+    if not raw:
+        return {}
+    try:
+        manifest = json.loads(raw)
+        assert isinstance(manifest, dict)
+        return {str(k): str(v) for k, v in manifest.items()}
+    except Exception:
+        raise UploadError("Manifest must be a JSON object mapping file names to trainings")
+
+
+def match_training(filename, manifest, trainings):
+    """
+    Find the training for a file: the manifest entry if any, otherwise the file name
+    without extension. Either may be a training ID or a training name (case-insensitive).
+    """
+
+    def normalise(value):
+        return " ".join(value.split()).lower()
+
+    key = normalise(manifest.get(filename, os.path.splitext(filename)[0]))
+    for training in trainings:
+        if str(training.id) == key or normalise(training.name) == key:
+            return training
+    return None
+
+
+# ---------------------------------------------------------------------
+# Bulk JSON records
+
+
+def bulk_record(item):
+    """
+    Validate one {user, training, timestamp, details} object of a bulk push.
+    Returns (user_id, unsaved TrainingRecord without user); raises ValueError.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Expected an object.")
+    user_id = item.get("user")
+    if not isinstance(user_id, str) or not user_id:
+        raise ValueError("'user' is required.")
+    training = catalog.get(item.get("training"))
+    if training is None:
+        raise ValueError("Training not found.")
+    timestamp = item.get("timestamp")
+    timestamp = parse_to_aware_datetime(timestamp) if isinstance(timestamp, str) else None
+    if timestamp is None:
+        raise ValueError("'timestamp' must be an ISO 8601 date or datetime.")
+    details = item.get("details", {})
+    if not isinstance(details, dict):
+        raise ValueError("'details' must be an object.")
+    if training.type == "LMS":
+        score = details.get("score")
+        if not isinstance(score, (int, float)) or isinstance(score, bool):
+            raise ValueError("'score' must be a number")
+
+    return user_id, TrainingRecord(training=training, timestamp=timestamp, details=details)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import POLICIES
+from core.models import ArchivedTrainingRecord, TrainingRecord
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stale training records to the archive (see core/archive.py). "
+        "Archived records are hidden unless ?include_archived=1 is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ungrouped",
+            type=int,
+            metavar="MONTHS",
+            help="records of users in no group, without membership or profile changes or "
+            "completed records for MONTHS months",
+        )
+        parser.add_argument(
+            "--expired",
+            type=int,
+            metavar="YEARS",
+            help="records that expired more than YEARS years ago",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="only count the records")
+
+    def handle(self, *args, **options):
+        selected = {name: options[name] for name in POLICIES if options[name] is not None}
+        if not selected:
+            raise CommandError(f"Choose at least one policy: --{', --'.join(POLICIES)}")
+
+        for name, value in selected.items():
+            records = TrainingRecord.objects.filter(POLICIES[name](value))
+            if options["dry_run"]:
+                self.stdout.write(f"{name}: {records.count()} record(s) would be archived")
+                continue
+            count = ArchivedTrainingRecord.objects.archive(records, reason=f"{name}:{value}")
+            self.stdout.write(f"{name}: archived {count} record(s)")
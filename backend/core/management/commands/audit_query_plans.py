@@ -0,0 +1,352 @@
+import json
+import random
+import re
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import (
+    AuditEvent,
+    Training,
+    TrainingRecord,
+    TrainingRecordHistory,
+    User,
+    UserAlias,
+    UserGroup,
+)
+from core.urls import urlpatterns
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "query_plans.json"
+
+# Representative query strings per URL name; {user}, {group} and {training} are filled
+# with sample IDs. Routes not listed here are requested once without parameters.
+ROUTE_PARAMS = {
+    "user-list": [
+        "",
+        "?name=smith",
+        "?id=0",
+        "?group={group}",
+        "?role=ADMIN&order_by=-name",
+    ],
+    "group-list": ["", "?name=group&order_by=-compliance", "?page=1&fields=id,name"],
+    "training-list": ["", "?group={group}&order_by=-pass_rate", "?type=LMS&search=safety&page=1"],
+    "training-users": ["", "?name=smith&order_by=name", "?id=0&status=PASSED"],
+    "training-record-list": [
+        "",
+        "?user_id=0",
+        "?user_name=smith&order_by=user_name",
+        "?training={training}&order_by=training",
+        "?from=2024-01-01&to=2025-01-01&expand=user,training",
+        "?include_archived=1&order_by=-timestamp",
+    ],
+    "user-training-history": ["", "?page=2"],
+    "compliance-trends": ["", "?group={group}", "?training={training}"],
+    "change-list": ["?since=0", "?since=0&limit=5000"],
+    "audit-list": [
+        "",
+        "?actor={user}",
+        "?model=user&object_id={user}",
+        "?action=UPDATE&before=1000",
+    ],
+}
+
+# POST routes without side effects: URL name -> JSON body
+READ_ONLY_POSTS = {
+    "compliance-matrix": [{"group": "{group}"}, {"group": "{group}", "encoding": "compact"}],
+}
+
+# Django's table aliases ("core_user" U1, "core_user" T3)
+ALIASES = re.compile(r'(?:FROM|JOIN)\s+"(\w+)"(?:\s+(?:AS\s+)?"?([A-Z]\d+)\b"?)?')
+SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX (\w+))?")
+SEARCH = re.compile(r"^SEARCH (\w+) USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY|PRIMARY KEY)")
+TEMP_BTREE = re.compile(r"^USE TEMP B-TREE FOR (.+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every read route of core/urls.py with representative parameters, run "
+        "EXPLAIN QUERY PLAN on each SQL statement and report full scans, temporary B-trees "
+        "and non-covering index lookups per view. Fails on full scans of large tables that "
+        "are not in the baseline. Seeded data is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=5000,
+            metavar="USERS",
+            help="add this many users (with groups and records) before auditing, rolled back "
+            "afterwards; 0 audits the database as it is (default: 5000)",
+        )
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="full scans of smaller tables never fail the audit (default: 1000)",
+        )
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="accept the current full scans as the new baseline",
+        )
+        parser.add_argument("--verbose", action="store_true", help="print every query plan")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN auditing is only implemented for SQLite")
+
+        # Requests must not close the connection (and lose the rolled-back transaction)
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=["testserver"]):
+                if options["seed"]:
+                    seed(options["seed"])
+                findings = self.audit(options["verbose"])
+                sizes = table_sizes({table for _, _, table, _ in findings if table})
+                transaction.set_rollback(True)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+        self.report(findings, sizes, options)
+
+    # ---------- requests ----------
+    def audit(self, verbose):
+        """[(view, kind, table or None, detail)] of every statement run by every route."""
+        samples = sample_ids()
+        client = APIClient()
+        client.force_authenticate(User.objects.filter(role="ADMIN").first())
+
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        indexes = index_tables()
+        findings = set()
+        for name, view, method, path, body in routes(samples):
+            statements.clear()
+            with connection.execute_wrapper(capture):
+                if method == "get":
+                    response = client.get(path)
+                else:
+                    response = client.post(path, body, format="json")
+            if response.status_code >= 400:
+                self.stderr.write(f"{method.upper()} {path}: HTTP {response.status_code}")
+
+            for sql, params in list(statements):
+                if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                    continue
+                plan = explain(sql, params)
+                if verbose:
+                    self.stdout.write(f"{view} {path}\n  {sql}\n    " + "\n    ".join(plan))
+                findings |= {
+                    (view, kind, table, detail)
+                    for kind, table, detail in analyse(sql, plan, indexes)
+                }
+        return findings
+
+    # ---------- report ----------
+    def report(self, findings, sizes, options):
+        by_view = defaultdict(list)
+        for view, kind, table, detail in sorted(findings, key=lambda f: (f[0], f[1], f[2] or "")):
+            by_view[view].append((kind, table, detail))
+
+        baseline_path = options["baseline"]
+        baseline = set(json.loads(baseline_path.read_text())) if baseline_path.exists() else set()
+        current = {f"{view} {table}" for view, kind, table, _ in findings if kind == "full scan"}
+        new = []
+
+        for view, items in by_view.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(view))
+            for kind, table, detail in items:
+                size = f" ({sizes[table]:,} rows)" if table in sizes else ""
+                line = f"  {kind:<18} {table or '':<28}{size} {detail}"
+                if kind == "full scan" and f"{view} {table}" not in baseline:
+                    if sizes.get(table, 0) >= options["min_rows"]:
+                        new.append(f"{view} {table}")
+                        line = self.style.ERROR(line + "  NEW")
+                self.stdout.write(line)
+
+        if options["update_baseline"]:
+            baseline_path.write_text(json.dumps(sorted(current), indent=2) + "\n")
+            self.stdout.write(f"Baseline written to {baseline_path} ({len(current)} full scans)")
+            return
+        if new:
+            self.stderr.write(f"{len(new)} new full scan(s) of large tables:")
+            for finding in new:
+                self.stderr.write(f"  {finding}")
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS("No new full scans of large tables"))
+
+
+def routes(samples):
+    """(url name, view name, method, path, body) for every read route, once per parameter set."""
+    seen = set()
+    for pattern in urlpatterns:
+        callback = getattr(pattern, "callback", None)
+        actions = getattr(callback, "actions", None)
+        if not actions or pattern.name in seen or "format" in pattern.pattern.regex.groupindex:
+            continue
+        seen.add(pattern.name)
+
+        basename = next(key for key in SAMPLES if pattern.name.startswith(key + "-"))
+        kwargs = {
+            key: samples["training" if key == "training_id" else basename]
+            for key in pattern.pattern.regex.groupindex
+        }
+        path = reverse(pattern.name, kwargs=kwargs)
+        if "get" in actions:
+            view = f"{callback.cls.__name__}.{actions['get']}"
+            for query in ROUTE_PARAMS.get(pattern.name, [""]):
+                yield pattern.name, view, "get", path + query.format(**samples), None
+        for body in READ_ONLY_POSTS.get(pattern.name, []):
+            view = f"{callback.cls.__name__}.{actions['post']}"
+            body = {key: value.format(**samples) for key, value in body.items()}
+            yield pattern.name, view, "post", path, body
+
+
+# URL name prefixes (router basenames) of the sample IDs, most specific first
+SAMPLES = ["training-record", "training", "user", "group", "compliance", "change", "audit"]
+
+
+def sample_ids():
+    record = TrainingRecord.objects.order_by("id").first()
+    group = UserGroup.objects.filter(users__isnull=False).order_by("id").first()
+    if record is None or group is None:
+        raise CommandError("The database has no records or groups to sample, use --seed")
+    return {
+        "user": record.user_id,
+        "training": str(record.training_id),
+        "training-record": str(record.id),
+        "group": str(group.id),
+    }
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+def index_tables():
+    """{index name: (table, primary key index?)} of the database."""
+    indexes = {}
+    with connection.cursor() as cursor:
+        tables = cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        for (table,) in tables:
+            for _, name, _, origin, _ in cursor.execute(f'PRAGMA index_list("{table}")'):
+                indexes[name] = (table, origin == "pk")
+    return indexes
+
+
+def analyse(sql, plan, indexes):
+    """(kind, table, detail) for the notable steps of a query plan."""
+    # Subqueries reuse aliases (U0, U1, ...), so an alias may stand for several tables
+    aliases = defaultdict(set)
+    for table, alias in ALIASES.findall(sql):
+        aliases[alias or table].add(table)
+        aliases[table].add(table)
+
+    def table_of(name, index=None):
+        if index in indexes:
+            return indexes[index][0]
+        return "/".join(sorted(aliases[name])) if name in aliases else None
+
+    # A scan in a LIMIT query without a sort step stops early (e.g. ORDER BY id DESC LIMIT 1)
+    limited = " LIMIT " in sql.upper() and not any(TEMP_BTREE.match(step) for step in plan)
+
+    for step in plan:
+        if match := SCAN.match(step):
+            table = table_of(match.group(1), match.group(3))
+            if table is None:
+                continue  # subquery / CTE
+            if match.group(2):
+                yield "index scan", table, match.group(3)
+            elif limited:
+                yield "limited scan", table, ""
+            else:
+                yield "full scan", table, ""
+        elif match := SEARCH.match(step):
+            index = step.split(" USING INDEX ")[-1].split(" ")[0]
+            # Rows are read from the table after the index (primary key lookups are expected)
+            if match.group(2) == "INDEX" and not indexes.get(index, (None, False))[1]:
+                yield "non-covering index", table_of(match.group(1), index), index
+        elif match := TEMP_BTREE.match(step):
+            yield "temp b-tree", None, match.group(1)
+
+
+def table_sizes(tables):
+    with connection.cursor() as cursor:
+        return {
+            table: cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for table in tables
+        }
+
+
+def seed(users, groups=40, seed=0):
+    """Bulk-insert a realistic population: users with aliases, group memberships, records."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    trainings = list(Training.objects.all())
+    if not trainings:
+        raise CommandError("No trainings to seed records for")
+
+    created = User.objects.bulk_create(
+        [User(id=str(90000000 + i), name=f"Seed User {i}", password="") for i in range(users)],
+        batch_size=2000,
+    )
+    UserAlias.objects.bulk_create(
+        [UserAlias(id=user.id, user=user) for user in created], batch_size=2000
+    )
+    seeded_groups = UserGroup.objects.bulk_create(
+        [UserGroup(name=f"Seed Group {i}") for i in range(groups)]
+    )
+    UserGroup.users.through.objects.bulk_create(
+        [
+            UserGroup.users.through(usergroup_id=group.id, user_id=user.id)
+            for user in created
+            for group in rng.sample(seeded_groups, 2)
+        ],
+        batch_size=5000,
+    )
+    Training.groups.through.objects.bulk_create(
+        [
+            Training.groups.through(training_id=training.id, usergroup_id=group.id)
+            for group in seeded_groups
+            for training in rng.sample(trainings, min(3, len(trainings)))
+        ]
+    )
+
+    records = [
+        TrainingRecord(
+            user_id=user.id,
+            training_id=training.id,
+            timestamp=now - timedelta(days=rng.randrange(1500)),
+            details={"score": rng.randrange(50, 101)} if training.type == "LMS" else {},
+        )
+        for user in created
+        for training in rng.sample(trainings, min(4, len(trainings)))
+    ]
+    TrainingRecord.objects.bulk_create(records, batch_size=2000)
+    TrainingRecordHistory.objects.append(records)
+    AuditEvent.objects.bulk_create(
+        [
+            AuditEvent(actor=user.id, action="UPDATE", model="user", object_id=user.id)
+            for user in created
+        ],
+        batch_size=5000,
+    )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from core.models import TrainingRecord, TrainingRecordAttachment, TrainingRecordHistory
+
+# Columns of a database from before the constraint (later ones may not exist yet)
+LEGACY_FIELDS = ("id", "user", "training", "timestamp", "details")
+
+
+class Command(BaseCommand):
+    help = (
+        "Collapse duplicate training records to the newest one per (user, training). "
+        "Run this before migrating a database created before the unique constraint existed."
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        newest = TrainingRecord.objects.filter(
+            user=OuterRef("user"), training=OuterRef("training")
+        ).order_by("-timestamp", "-id")
+        stale = TrainingRecord.objects.exclude(id=Subquery(newest.values("id")[:1]))
+
+        # Attachments move to the record that is kept for their (user, training)
+        moves = (
+            stale.filter(attachments__isnull=False)
+            .annotate(keep_id=Subquery(newest.values("id")[:1]))
+            .values_list("id", "keep_id")
+            .distinct()
+        )
+        moved = 0
+        for record_id, keep_id in moves:
+            moved += TrainingRecordAttachment.objects.filter(record_id=record_id).update(
+                record_id=keep_id
+            )
+
+        # The removed completions stay in the history; deletions go to the change feed
+        TrainingRecordHistory.objects.append(stale.only(*LEGACY_FIELDS))
+        _, deleted = stale.only("id").delete()
+        count = deleted.get(TrainingRecord._meta.label, 0)
+        self.stdout.write(f"Removed {count} duplicate record(s), moved {moved} attachment(s)")
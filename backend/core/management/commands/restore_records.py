@@ -0,0 +1,43 @@
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from core.aliases import aliases
+from core.models import ArchivedTrainingRecord
+
+
+class Command(BaseCommand):
+    help = "Move archived training records back (see archive_records)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", help="UWA ID (repeatable)")
+        parser.add_argument("--training", action="append", help="training ID or name (repeatable)")
+        parser.add_argument("--all", action="store_true", help="restore the whole archive")
+
+    def handle(self, *args, **options):
+        if not (options["user"] or options["training"] or options["all"]):
+            raise CommandError("Give --user, --training or --all")
+
+        archived = ArchivedTrainingRecord.objects.all()
+        if options["user"]:
+            resolved = aliases.resolve_many(options["user"])
+            missing = [uid for uid in options["user"] if uid not in resolved]
+            if missing:
+                raise CommandError(f"Unknown UWA ID(s): {', '.join(missing)}")
+            archived = archived.filter(user__in=resolved.values())
+        if options["training"]:
+            names = options["training"]
+            ids = [value for value in names if _is_uuid(value)]
+            archived = archived.filter(Q(training__name__in=names) | Q(training_id__in=ids))
+
+        count = archived.restore()
+        self.stdout.write(f"Restored {count} record(s)")
+
+
+def _is_uuid(value):
+    try:
+        UUID(value)
+    except ValueError:
+        return False
+    return True
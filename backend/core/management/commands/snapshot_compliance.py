@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+from core.compliance import snapshot_counts
+from core.models import ComplianceSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Store today's compliance status counts per training and group, "
+        "for GET /compliance/trends. Run it daily or weekly (e.g. from cron)."
+    )
+
+    def handle(self, *args, **options):
+        date = timezone.localdate()
+        counts = snapshot_counts()
+        with transaction.atomic():
+            # Re-running on the same day replaces that day's snapshot
+            ComplianceSnapshot.objects.filter(date=date).delete()
+            ComplianceSnapshot.objects.bulk_create(
+                (
+                    ComplianceSnapshot(
+                        date=date,
+                        training_id=training_id,
+                        group_id=group_id,
+                        status=status,
+                        count=count,
+                    )
+                    for (training_id, group_id, status), count in counts.items()
+                ),
+                batch_size=5000,
+            )
+        self.stdout.write(f"Snapshot {date}: {len(counts)} rows")
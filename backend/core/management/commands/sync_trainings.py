@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.connectors import sync
+
+
+class Command(BaseCommand):
+    help = (
+        "Pull new training records from external sources (see core/connectors.py). "
+        "Runs once, or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--training", action="append", help="training ID or name (repeatable)")
+        parser.add_argument("--type", action="append", help="connector type, e.g. LMS (repeatable)")
+        parser.add_argument("--interval", type=float, help="keep running, syncing every N seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            errors = sync(options["training"], options["type"], log=self.stdout.write)
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+        if errors:
+            self.stderr.write(f"{len(errors)} training(s) failed")
+            raise SystemExit(1)
@@ -1,10 +1,13 @@
+import json
+import zlib
 from datetime import timedelta
 from django.utils import timezone
-from django.db import models
+from django.db import models, connections, transaction
 from django.core.validators import RegexValidator, MinValueValidator
 from django.contrib.auth.models import AbstractBaseUser
 from uuid import uuid4
-from urllib.parse import quote
+
+from core.avatars import avatar_url
 
 
 class HasUwaId(models.Model):
@@ -25,6 +28,8 @@ class User(HasUwaId, AbstractBaseUser):
     name = models.CharField(max_length=127)
     # User Role
     role = models.CharField(max_length=15, choices=ROLE_CHOICES, default="VIEWER")
+    # Updated At
+    updated_at = models.DateTimeField(auto_now=True)
 
     # We do not need username or email for this app.
     # Use the primary key to satisfy AbstractBaseUser requirements.
@@ -32,13 +37,14 @@ class User(HasUwaId, AbstractBaseUser):
 
     @property
     def avatar(self):
-        encoded_name = quote(self.name)
-        return f"https://ui-avatars.com/api/?background=random&name={encoded_name}"
+        return avatar_url(self.name)
 
 
 class UserAlias(HasUwaId):
     # Target User
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="aliases")
+    # Updated At
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class UserGroup(models.Model):
@@ -46,6 +52,8 @@ class UserGroup(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     # Created At
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Updated At
+    updated_at = models.DateTimeField(auto_now=True)
     # Group Name (Unique)
     name = models.CharField(max_length=127, unique=True)
     # Group Description
@@ -65,6 +73,8 @@ class Training(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     # Created At
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Updated At
+    updated_at = models.DateTimeField(auto_now=True)
     # Traing Name
     name = models.CharField(max_length=127, unique=True)
     # Training Description
@@ -79,7 +89,74 @@ class Training(models.Model):
     groups = models.ManyToManyField(UserGroup, related_name="trainings", blank=True)
 
 
+class TrainingRecordQuerySet(models.QuerySet):
+    def upsert_latest(self, records):
+        """
+        Insert unsaved records, or overwrite the stored record of the same
+        (user, training) pair when the incoming one is newer.
+        Runs one INSERT ... ON CONFLICT DO UPDATE statement per chunk, so there
+        is no read-before-write and concurrent imports cannot race.
+        Returns {(user_id, training_id): record_id} of the rows inserted or replaced.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        fields = [
+            opts.get_field(name)
+            for name in ("id", "user", "training", "timestamp", "details", "updated_at")
+        ]
+
+        # Newest wins within the batch too (a statement may not touch a row twice)
+        incoming = records
+        latest = {}
+        for record in records:
+            key = (record.user_id, record.training_id)
+            if key not in latest or latest[key].timestamp < record.timestamp:
+                latest[key] = record
+        records = list(latest.values())
+
+        table = qn(opts.db_table)
+        columns = ", ".join(qn(f.column) for f in fields)
+        row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+        conflict = ", ".join(qn(f.column) for f in fields[1:3])
+        ts, details, updated_at = (qn(f.column) for f in fields[3:])
+        batch_size = connection.ops.bulk_batch_size(fields, records) or len(records)
+
+        changed = {}
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            # Every incoming record is kept in the history, even if it is not the latest
+            TrainingRecordHistory.objects.append(incoming)
+
+            for start in range(0, len(records), batch_size):
+                chunk = records[start : start + batch_size]
+                params = [
+                    f.get_db_prep_save(f.pre_save(record, True), connection)
+                    for record in chunk
+                    for f in fields
+                ]
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(chunk))} "
+                    f"ON CONFLICT ({conflict}) DO UPDATE SET "
+                    f"{ts} = excluded.{ts}, {details} = excluded.{details}, "
+                    f"{updated_at} = excluded.{updated_at} "
+                    f"WHERE excluded.{ts} > {table}.{ts} "
+                    f"RETURNING {', '.join(qn(f.column) for f in fields[:3])}",
+                    params,
+                )
+                for pk, user_id, training_id in cursor.fetchall():
+                    key = (fields[1].to_python(user_id), fields[2].to_python(training_id))
+                    changed[key] = fields[0].to_python(pk)
+
+            # Only rows actually inserted or replaced are returned by the statement
+            ChangeLogEntry.objects.log("record", changed.values())
+
+        return changed
+
+
 class TrainingRecord(models.Model):
+    # Only the latest record of each (user, training) pair is stored
+    objects = TrainingRecordQuerySet.as_manager()
+
     # Training Record ID
     id = models.UUIDField(primary_key=True, default=uuid4)
     # Source User
@@ -90,16 +167,33 @@ class TrainingRecord(models.Model):
     timestamp = models.DateTimeField()
     # Dynamic payload (scores, certificates, external references, etc.)
     details = models.JSONField(default=dict)
+    # Updated At
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "training"], name="unique_user_training_record"
+            ),
+        ]
+
+    @property
+    def cached_training(self):
+        # Read-only copy from the in-process catalog, avoids a query per record
+        from core.catalog import catalog
+
+        return catalog.get(self.training_id) or self.training
 
     def is_completed(self):
-        if self.training.type == "LMS":
+        training = self.cached_training
+        if training.type == "LMS":
             score = self.details.get("score")
-            completance_score = self.training.config.get("completance_score")
+            completance_score = training.config.get("completance_score")
             return isinstance(score, (int, float)) and score >= completance_score
         return True  # Non-LMS trainings are always "passed"
 
     def is_expired(self):
-        training_expiry = self.training.expiry
+        training_expiry = self.cached_training.expiry
         expiry_date = self.timestamp + timedelta(days=training_expiry)
         return (training_expiry > 0) and (timezone.now() > expiry_date)
 
@@ -112,6 +206,174 @@ class TrainingRecord(models.Model):
         return "PASSED"
 
 
+class TrainingRecordHistoryQuerySet(models.QuerySet):
+    def append(self, records):
+        """
+        Bulk-append TrainingRecord instances (saved or not) to the history.
+        The same completion (user, training, timestamp) is stored once;
+        writing it again only refreshes its details.
+        """
+        rows = {
+            (record.user_id, record.training_id, record.timestamp): TrainingRecordHistory(
+                user_id=record.user_id,
+                training_id=record.training_id,
+                year=timezone.localtime(record.timestamp).year,
+                timestamp=record.timestamp,
+                details=record.details,
+            )
+            for record in records
+        }
+        self.bulk_create(
+            list(rows.values()),
+            update_conflicts=True,
+            unique_fields=["user", "training", "timestamp"],
+            update_fields=["details"],
+        )
+
+
+class TrainingRecordHistory(models.Model):
+    # Append-only log of every record ever written.
+    # TrainingRecord keeps only the latest one, so "latest" reads never scan history.
+    objects = TrainingRecordHistoryQuerySet.as_manager()
+
+    # Source User
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="record_history")
+    # Source Training
+    training = models.ForeignKey(Training, on_delete=models.CASCADE, related_name="record_history")
+    # Year of completion (local time), for per-training yearly reporting
+    year = models.SmallIntegerField()
+    # Completed at
+    timestamp = models.DateTimeField()
+    # Dynamic payload (scores, certificates, external references, etc.)
+    details = models.JSONField(default=dict)
+    # Written at
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "training", "timestamp"], name="unique_user_training_history"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["training", "year"], name="history_training_year_idx"),
+        ]
+
+
+class ChangeLogEntryQuerySet(models.QuerySet):
+    def log(self, model, object_ids, action="UPDATE", related_ids=None):
+        """
+        Bulk-append change entries for one model.
+        related_ids is given for membership changes (ADD / REMOVE).
+        """
+        self.bulk_create(
+            [
+                ChangeLogEntry(
+                    model=model,
+                    object_id=str(object_id),
+                    action=action,
+                    related_id=str(related_id) if related_id is not None else "",
+                )
+                for object_id in object_ids
+                for related_id in (related_ids if related_ids is not None else [None])
+            ]
+        )
+
+
+class ChangeLogEntry(models.Model):
+    # Change feed for incremental sync, see GET /changes.
+    # The auto-increment ID is the sync cursor.
+    objects = ChangeLogEntryQuerySet.as_manager()
+
+    ACTION_CHOICES = (
+        ("UPDATE", "Created or Updated"),
+        ("DELETE", "Deleted"),
+        ("ADD", "Membership Added"),
+        ("REMOVE", "Membership Removed"),
+    )
+
+    # Changed Model (user, alias, group, training, record, group_users, training_groups)
+    model = models.CharField(max_length=31)
+    # Changed Object ID (the group / training for membership changes)
+    object_id = models.CharField(max_length=63)
+    # Change Type
+    action = models.CharField(max_length=15, choices=ACTION_CHOICES)
+    # Added / Removed Member ID (membership changes only)
+    related_id = models.CharField(max_length=63, default="", blank=True)
+    # Changed At
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+
+class CacheVersionQuerySet(models.QuerySet):
+    def bump(self, key):
+        if not self.filter(key=key).update(version=models.F("version") + 1):
+            self.get_or_create(key=key)
+
+
+class CacheVersion(models.Model):
+    # Version stamps shared by all workers, used to invalidate process-local caches
+    objects = CacheVersionQuerySet.as_manager()
+
+    # Cache Name
+    key = models.CharField(primary_key=True, max_length=63)
+    # Bumped on every change of the cached data
+    version = models.PositiveBigIntegerField(default=1)
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    # How long a stored response can be replayed
+    TTL = timedelta(hours=24)
+
+    def lookup(self, user, key):
+        return self.filter(user=user, key=key, created_at__gte=timezone.now() - self.TTL).first()
+
+    def store(self, user, key, request_hash, response):
+        self.filter(created_at__lt=timezone.now() - self.TTL).delete()
+        self.update_or_create(
+            user=user,
+            key=key,
+            defaults={"request_hash": request_hash, "response": response},
+        )
+
+
+class IdempotencyKey(models.Model):
+    # Responses of bulk writes, replayed when a client retries with the same Idempotency-Key
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    # Client (keys are scoped per user)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    # Idempotency-Key header
+    key = models.CharField(max_length=255)
+    # SHA-256 of the request body, the same key may not be reused for another body
+    request_hash = models.CharField(max_length=64)
+    # Response payload
+    response = models.JSONField()
+    # Stored at
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_user_idempotency_key"),
+        ]
+
+
+class SyncWatermark(models.Model):
+    # Progress of the connector pulling records for a training, see core/connectors.py
+
+    # Synced Training
+    training = models.OneToOneField(
+        Training, primary_key=True, on_delete=models.CASCADE, related_name="watermark"
+    )
+    # Opaque source cursor, only records after it are pulled next time
+    cursor = models.CharField(max_length=255, default="", blank=True)
+    # Last Successful Sync
+    synced_at = models.DateTimeField(null=True, blank=True)
+    # Last Error ("" if the last run succeeded), or why items were skipped
+    error = models.TextField(default="", blank=True)
+    # Items skipped because their user does not exist yet, retried on every run
+    pending = models.JSONField(default=list, blank=True)
+
+
 class TrainingRecordAttachment(models.Model):
     # File Name
     name = models.CharField(max_length=255)
@@ -126,3 +388,181 @@ class TrainingRecordAttachment(models.Model):
     def path(self):
         # To be adapted later
         return f"/media/{self.sha256}"
+
+
+class ComplianceSnapshotQuerySet(models.QuerySet):
+    def trend(self, start, end, training=None, group=None):
+        """
+        {date: {status code: count}} between two dates (inclusive), summed over trainings.
+        Without a group, each user is counted once per training.
+        """
+        qs = self.filter(date__range=(start, end), group=group)
+        if training is not None:
+            qs = qs.filter(training=training)
+        trend = {}
+        for date, status, count in (
+            qs.order_by().values_list("date", "status").annotate(n=models.Sum("count"))
+        ):
+            trend.setdefault(date, {})[status] = count
+        return trend
+
+
+class ComplianceSnapshot(models.Model):
+    # Point-in-time status counts, written by `manage.py snapshot_compliance`
+    objects = ComplianceSnapshotQuerySet.as_manager()
+
+    # Snapshot Date
+    date = models.DateField(db_index=True)
+    # Training
+    training = models.ForeignKey(Training, on_delete=models.CASCADE, related_name="+")
+    # Group (null == all assigned users, each counted once)
+    group = models.ForeignKey(UserGroup, null=True, on_delete=models.CASCADE, related_name="+")
+    # Status (index in core.compliance.STATUSES)
+    status = models.PositiveSmallIntegerField()
+    # Number of (user, training) pairs in that status
+    count = models.PositiveIntegerField()
+
+
+class ArchivedTrainingRecordQuerySet(models.QuerySet):
+    CHUNK = 2000
+
+    def archive(self, records, reason):
+        """
+        Move the TrainingRecords of the `records` queryset to the archive.
+        Records with attachments stay where they are.
+        Works in chunks, one transaction each, so the write lock is held briefly.
+        Returns the number of archived records.
+        """
+        ids = list(records.filter(attachments__isnull=True).values_list("id", flat=True))
+        for start in range(0, len(ids), self.CHUNK):
+            chunk = TrainingRecord.objects.filter(pk__in=ids[start : start + self.CHUNK])
+            with transaction.atomic(using=self.db):
+                self.bulk_create(
+                    [
+                        ArchivedTrainingRecord(
+                            id=record.id,
+                            user_id=record.user_id,
+                            training_id=record.training_id,
+                            timestamp=record.timestamp,
+                            compressed_details=ArchivedTrainingRecord.compress(record.details),
+                            reason=reason,
+                        )
+                        for record in chunk
+                    ]
+                )
+                chunk.delete()  # logged to the change feed as deletions
+        return len(ids)
+
+    def restore(self):
+        """
+        Move these archived records back to TrainingRecord, newest wins against
+        records written since. Returns the number of restored records.
+        """
+        ids = list(self.values_list("id", flat=True))
+        for start in range(0, len(ids), self.CHUNK):
+            chunk = self.model.objects.filter(pk__in=ids[start : start + self.CHUNK])
+            with transaction.atomic(using=self.db):
+                TrainingRecord.objects.upsert_latest([archived.to_record() for archived in chunk])
+                chunk.delete()
+        return len(ids)
+
+
+class ArchivedTrainingRecord(models.Model):
+    # Cold storage for stale TrainingRecords, see `manage.py archive_records`.
+    # Read only with ?include_archived=1, brought back by `manage.py restore_records`.
+    objects = ArchivedTrainingRecordQuerySet.as_manager()
+
+    # Training Record ID (of the original record)
+    id = models.UUIDField(primary_key=True)
+    # Source User
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    # Source Training
+    training = models.ForeignKey(Training, on_delete=models.CASCADE, related_name="+")
+    # Completed at
+    timestamp = models.DateTimeField()
+    # zlib-compressed JSON of TrainingRecord.details
+    compressed_details = models.BinaryField()
+    # Archiving Policy
+    reason = models.CharField(max_length=63)
+    # Archived At
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def compress(details):
+        return zlib.compress(json.dumps(details, separators=(",", ":")).encode())
+
+    @property
+    def details(self):
+        return json.loads(zlib.decompress(self.compressed_details))
+
+    def to_record(self):
+        """Unsaved TrainingRecord with the archived data (and the loaded user, if any)."""
+        record = TrainingRecord(
+            id=self.id,
+            user_id=self.user_id,
+            training_id=self.training_id,
+            timestamp=self.timestamp,
+            details=self.details,
+        )
+        if ArchivedTrainingRecord.user.is_cached(self):
+            record.user = self.user
+        if hasattr(self, "sort_key"):  # see core.archive.MergedRecords
+            record.sort_key = self.sort_key
+        return record
+
+
+class AuditEventQuerySet(models.QuerySet):
+    def insert(self, events):
+        """
+        Write unsaved events with one executemany() of a single-row INSERT: one prepared
+        statement for the whole batch, where bulk_create() would split it into statements
+        of ~140 rows to stay under SQLite's bound-variable limit.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        fields = [f for f in self.model._meta.concrete_fields if not f.primary_key]
+        columns = ", ".join(qn(f.column) for f in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {qn(self.model._meta.db_table)} ({columns}) VALUES ({placeholders})",
+                [
+                    [f.get_db_prep_save(f.pre_save(event, True), connection) for f in fields]
+                    for event in events
+                ],
+            )
+
+
+class AuditEvent(models.Model):
+    # Who changed what through the admin API, see GET /audit.
+    # Buffered and bulk-written by core.audit; the auto-increment ID is the paging cursor.
+    objects = AuditEventQuerySet.as_manager()
+
+    ACTION_CHOICES = (
+        ("CREATE", "Created"),
+        ("UPDATE", "Updated"),
+        ("DELETE", "Deleted"),
+        ("ADD", "Membership Added"),
+        ("REMOVE", "Membership Removed"),
+        ("IMPORT", "Imported"),
+        ("HISTORY", "Added to History Only"),
+    )
+
+    # Occurred At (when the change was made, not when the event was written)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    # Acting User ID ("" for changes made without a request user)
+    actor = models.CharField(max_length=63)
+    # Change Type
+    action = models.CharField(max_length=15, choices=ACTION_CHOICES)
+    # Changed Model (user, alias, group, training, record)
+    model = models.CharField(max_length=31)
+    # Changed Object ID
+    object_id = models.CharField(max_length=63)
+    # {field: [before, after]} for updates, the created values or the members / counts otherwise
+    changes = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["model", "object_id", "id"], name="audit_object_idx"),
+            models.Index(fields=["actor", "id"], name="audit_actor_idx"),
+        ]
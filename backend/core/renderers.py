@@ -0,0 +1,63 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to DRF's stdlib renderer
+    orjson = None
+
+
+# Reuse DRF's encoder for anything orjson does not know about
+# (Decimal, lazy strings, timedelta, querysets, ...)
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer.
+    Uses orjson when installed (UUIDs and datetimes are encoded natively),
+    otherwise falls back to the stock json.dumps implementation.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=_encoder.default)
+
+
+def to_columnar(rows):
+    """
+    Convert a list of dicts into a dict of lists.
+    Example: [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+          -> {"id": [1, 2], "name": ["a", "b"]}
+    """
+    columns = {}
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns[key] = []
+    for key, values in columns.items():
+        values.extend(row.get(key) for row in rows)
+    return columns
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """
+    Opt-in compact shape for table views, selected with `?format=columnar`.
+    Paginated responses keep their envelope and only `items` becomes columnar;
+    plain list responses are converted as a whole.
+    """
+
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None and response.status_code >= 400:
+            pass  # leave error payloads untouched
+        elif isinstance(data, list):
+            data = to_columnar(data)
+        elif isinstance(data, dict) and isinstance(data.get("items"), list):
+            data = {**data, "items": to_columnar(data["items"])}
+        return super().render(data, accepted_media_type, renderer_context)
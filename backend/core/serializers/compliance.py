@@ -0,0 +1,15 @@
+from rest_framework import serializers
+from core.models import UserGroup
+
+
+class ComplianceMatrixSerializer(serializers.Serializer):
+    # UWA IDs (primary IDs or aliases)
+    users = serializers.ListField(child=serializers.CharField(), required=False)
+    group = serializers.PrimaryKeyRelatedField(queryset=UserGroup.objects.all(), required=False)
+    # dense: status names per user/training; compact: status codes plus index arrays
+    encoding = serializers.ChoiceField(choices=["dense", "compact"], default="dense")
+
+    def validate(self, data):
+        if "users" not in data and "group" not in data:
+            raise serializers.ValidationError("Either 'users' or 'group' is required")
+        return data
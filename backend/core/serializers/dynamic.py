@@ -0,0 +1,52 @@
+def dynamic_fields(request):
+    """
+    Read sparse fieldset / expansion options from the query string.
+    Example: ?fields=id,name&expand=user,training
+    Returns kwargs for DynamicFieldsMixin serializers and their prepare_queryset().
+    """
+
+    def parse(key):
+        return {
+            value.strip()
+            for raw in request.query_params.getlist(key)
+            for value in raw.split(",")
+            if value.strip()
+        }
+
+    return {"fields": parse("fields") or None, "expand": parse("expand")}
+
+
+class DynamicFieldsMixin:
+    """
+    ModelSerializer mixin that takes two extra keyword arguments:
+      - fields: only serialise these fields (None == all fields)
+      - expand: embed these relations using the serializers in `expandable_fields`
+    Nested serializers are created without these arguments, so they always render in full.
+    """
+
+    # Relation name -> serializer class used when the relation is expanded
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in expand:
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def wanted_fields(cls, fields=None):
+        declared = set(cls.Meta.fields)
+        return declared if fields is None else declared & set(fields)
+
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        """
+        Trim and batch-load the queryset for the given fields / expansions.
+        Override in subclasses; the default leaves the queryset untouched.
+        """
+        return qs
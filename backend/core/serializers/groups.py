@@ -1,13 +1,72 @@
+from django.db.models import F, FloatField, OuterRef, Prefetch
+from django.db.models.functions import Cast, NullIf
 from rest_framework import serializers
-from core.models import UserGroup, User, Training
+from core.catalog import catalog
+from core.compliance import passed_q, status_rules
+from core.models import UserGroup, User, Training, TrainingRecord
+from core.serializers.dynamic import DynamicFieldsMixin
+from core.utils import count_subquery
 
 
-class UserGroupSerializer(serializers.ModelSerializer):
+class UserGroupSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserGroup
         fields = ["id", "name", "description", "trainings", "timestamp"]
         read_only_fields = ["id", "timestamp"]
 
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        fields = cls.wanted_fields(fields)
+        qs = qs.only("id", *(fields - {"trainings"}))
+        if "trainings" in fields:
+            qs = qs.prefetch_related(Prefetch("trainings", queryset=Training.objects.only("id")))
+        return qs
+
+
+class UserGroupListSerializer(UserGroupSerializer):
+    """
+    Group with aggregate statistics, computed by prepare_queryset() as subqueries
+    of the list query itself.
+    compliance is the percentage of (member, assigned training) pairs with a PASSED record
+    (null when the group has no members or no trainings).
+    """
+
+    STATS = {"member_count", "training_count", "compliance"}
+
+    member_count = serializers.IntegerField(read_only=True)
+    training_count = serializers.IntegerField(read_only=True)
+    compliance = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta(UserGroupSerializer.Meta):
+        fields = UserGroupSerializer.Meta.fields + ["member_count", "training_count", "compliance"]
+
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        fields = cls.wanted_fields(fields)
+        qs = super().prepare_queryset(qs, fields - cls.STATS, expand)
+
+        members = UserGroup.users.through.objects.filter(usergroup=OuterRef("pk"))
+        trainings = Training.groups.through.objects.filter(usergroup=OuterRef("pk"))
+
+        if fields & {"member_count", "compliance"}:
+            qs = qs.annotate(member_count=count_subquery(members, "usergroup"))
+        if fields & {"training_count", "compliance"}:
+            qs = qs.annotate(training_count=count_subquery(trainings, "usergroup"))
+        if "compliance" in fields:
+            # Only the latest record per (user, training) is stored, so records == pairs
+            passed = TrainingRecord.objects.filter(
+                passed_q(status_rules(catalog.all().values())),
+                user__groups=OuterRef("pk"),
+                training__groups=OuterRef("pk"),
+            )
+            qs = qs.annotate(
+                passed_count=count_subquery(passed, "training__groups"),
+                compliance=100
+                * Cast(F("passed_count"), FloatField())
+                / NullIf(F("member_count") * F("training_count"), 0),
+            )
+        return qs
+
 
 class GroupBatchManageUsersSerializer(serializers.Serializer):
     group = serializers.PrimaryKeyRelatedField(queryset=UserGroup.objects.all())
@@ -1,29 +1,81 @@
-from ..models import TrainingRecord
+from django.db import transaction
+from django.db.models import Prefetch
+from ..models import TrainingRecord, TrainingRecordHistory, User, Training
 from rest_framework import serializers
+from core.catalog import catalog
+from core.serializers.dynamic import DynamicFieldsMixin
+from core.serializers.users import UserSerializer
+from core.serializers.trainings import TrainingSerializer
+
+
+# --------- Fields ---------
+class CatalogTrainingField(serializers.PrimaryKeyRelatedField):
+    """Training ID input resolved from the in-process catalog instead of a query."""
+
+    def __init__(self, **kwargs):
+        super().__init__(queryset=Training.objects.all(), **kwargs)
+
+    def to_internal_value(self, data):
+        training = catalog.get(data)
+        if training is None:
+            self.fail("does_not_exist", pk_value=data)
+        return training
+
+
+class CatalogTrainingSerializer(TrainingSerializer):
+    """Expanded training rendered from the in-process catalog."""
+
+    def get_attribute(self, instance):
+        return catalog.get(instance.training_id) or instance.training
 
 
 # --------- Serializers (inline) ---------
-class TrainingRecordReadSerializer(serializers.ModelSerializer):
+class TrainingRecordReadSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"user": UserSerializer, "training": CatalogTrainingSerializer}
+
     class Meta:
         model = TrainingRecord
         fields = ["id", "user", "training", "timestamp", "details", "status"]
         read_only_fields = ["id", "user", "training", "status"]
 
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        fields = cls.wanted_fields(fields)
+
+        # status is derived from timestamp, details and the (cached) training
+        columns = {"id", "user", "training"} | ({"timestamp", "details"} & fields)
+        if "status" in fields:
+            columns |= {"timestamp", "details"}
+        qs = qs.only(*columns)
+
+        # One batched query per expanded relation (trainings come from the catalog)
+        if "user" in fields and "user" in expand:
+            qs = qs.prefetch_related(
+                Prefetch("user", queryset=UserSerializer.prepare_queryset(User.objects.all()))
+            )
+        return qs
+
+    @classmethod
+    def prepare_archived(cls, qs, fields=None, expand=()):
+        """prepare_queryset() for ArchivedTrainingRecords, rendered through to_record()."""
+        if "user" in cls.wanted_fields(fields) and "user" in expand:
+            qs = qs.prefetch_related(
+                Prefetch("user", queryset=UserSerializer.prepare_queryset(User.objects.all()))
+            )
+        return qs
+
 
 class TrainingRecordCreateSerializer(serializers.ModelSerializer):
+    training = CatalogTrainingField()
+
     class Meta:
         model = TrainingRecord
         fields = ["user", "training", "timestamp", "details"]
+        # Existing (user, training) pairs are upserted, not rejected
+        validators = []
 
     def validate(self, data):
         training = data["training"]
-
-        if TrainingRecord.objects.filter(user=data["user"], training=data["training"]).exists():
-            raise serializers.ValidationError(
-                f"User {data['user'].name} is already assigned to training {data['training'].name}"
-            )
-
-        training = data["training"]
         details = data.get("details", {})
         if training.type == "LMS":
             score = details.get("score")
@@ -32,7 +84,16 @@ class TrainingRecordCreateSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        return TrainingRecord.objects.create(**validated_data)
+        # Newest wins: an older record for the same (user, training) is left untouched
+        record = TrainingRecord(**validated_data)
+        written = TrainingRecord.objects.upsert_latest([record])
+        pair = (record.user_id, record.training_id)
+        # "created", "updated" (replaced the stored record) or "history" (only kept in history)
+        if pair not in written:
+            self.outcome = "history"
+        else:
+            self.outcome = "created" if written[pair] == record.id else "updated"
+        return TrainingRecord.objects.get(user=record.user, training=record.training)
 
 
 class TrainingRecordPatchSerializer(serializers.ModelSerializer):
@@ -41,10 +102,22 @@ class TrainingRecordPatchSerializer(serializers.ModelSerializer):
         fields = ["timestamp", "details"]
 
     def validate(self, data):
-        training = self.instance.training
+        training = self.instance.cached_training
         details = data.get("details", {})
         if training.type == "LMS":
             score = details.get("score")
             if not isinstance(score, (int, float)):
                 raise serializers.ValidationError("'score' must be a number")
         return data
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        record = super().update(instance, validated_data)
+        TrainingRecordHistory.objects.append([record])
+        return record
+
+
+class TrainingRecordHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrainingRecordHistory
+        fields = ["timestamp", "details", "recorded_at"]
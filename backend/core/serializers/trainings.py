@@ -1,6 +1,12 @@
 # core/serializers/trainings.py
+from django.db.models import Count, F, FloatField, OuterRef, Prefetch
+from django.db.models.functions import Cast, NullIf
 from rest_framework import serializers
-from core.models import Training, User
+from core.catalog import catalog
+from core.compliance import passed_q, status_rules
+from core.models import Training, TrainingRecord, User, UserGroup
+from core.serializers.dynamic import DynamicFieldsMixin
+from core.utils import count_subquery
 
 
 class TrainingUserStatusSerializer(serializers.ModelSerializer):
@@ -11,7 +17,7 @@ class TrainingUserStatusSerializer(serializers.ModelSerializer):
         fields = ["id", "status"]
 
 
-class TrainingSerializer(serializers.ModelSerializer):
+class TrainingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # NEW: include groups in every training payload
     groups = serializers.SerializerMethodField()
 
@@ -29,7 +35,70 @@ class TrainingSerializer(serializers.ModelSerializer):
         ]
 
     def get_groups(self, obj):
-        return list(obj.groups.values_list("id", flat=True))
+        # Catalog copies carry their group IDs
+        if hasattr(obj, "group_ids"):
+            return list(obj.group_ids)
+        # .all() (instead of values_list) so a prefetched "groups" is reused
+        return [group.id for group in obj.groups.all()]
+
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        fields = cls.wanted_fields(fields)
+        qs = qs.only("id", *(fields - {"groups"}))
+        if "groups" in fields:
+            qs = qs.prefetch_related(Prefetch("groups", queryset=UserGroup.objects.only("id")))
+        return qs
+
+
+class TrainingListSerializer(TrainingSerializer):
+    """
+    Training with aggregate statistics, computed by prepare_queryset() as subqueries
+    of the list query itself.
+    pass_rate is the share of the training's records that are PASSED (null without records).
+    """
+
+    STATS = {"group_count", "user_count", "record_count", "pass_rate"}
+
+    group_count = serializers.IntegerField(read_only=True)
+    user_count = serializers.IntegerField(read_only=True)
+    record_count = serializers.IntegerField(read_only=True)
+    pass_rate = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta(TrainingSerializer.Meta):
+        fields = TrainingSerializer.Meta.fields + [
+            "group_count",
+            "user_count",
+            "record_count",
+            "pass_rate",
+        ]
+
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        fields = cls.wanted_fields(fields)
+        qs = super().prepare_queryset(qs, fields - cls.STATS, expand)
+
+        training_groups = Training.groups.through.objects.filter(training=OuterRef("pk"))
+        memberships = UserGroup.users.through.objects.filter(usergroup__trainings=OuterRef("pk"))
+        records = TrainingRecord.objects.filter(training=OuterRef("pk"))
+
+        if "group_count" in fields:
+            qs = qs.annotate(group_count=count_subquery(training_groups, "training"))
+        if "user_count" in fields:
+            qs = qs.annotate(
+                user_count=count_subquery(
+                    memberships, "usergroup__trainings", Count("user", distinct=True)
+                )
+            )
+        if fields & {"record_count", "pass_rate"}:
+            qs = qs.annotate(record_count=count_subquery(records, "training"))
+        if "pass_rate" in fields:
+            # Pass rules come from the catalog, they are evaluated in SQL
+            passed = records.filter(passed_q(status_rules(catalog.all().values())))
+            qs = qs.annotate(
+                passed_count=count_subquery(passed, "training"),
+                pass_rate=Cast(F("passed_count"), FloatField()) / NullIf(F("record_count"), 0),
+            )
+        return qs
 
 
 class TrainingCreateSerializer(serializers.ModelSerializer):
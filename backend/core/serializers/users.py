@@ -1,15 +1,35 @@
 # core/serializers/users.py
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 
-from core.models import User, UserAlias
+from core.aliases import aliases
+from core.models import User, UserAlias, UserGroup
+from core.serializers.dynamic import DynamicFieldsMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "avatar", "name", "role", "aliases", "groups"]
 
+    @classmethod
+    def prepare_queryset(cls, qs, fields=None, expand=()):
+        fields = cls.wanted_fields(fields)
+
+        columns = {"id"} | ({"name", "role"} & fields)
+        if "avatar" in fields:
+            columns.add("name")
+        qs = qs.only(*columns)
+
+        if "aliases" in fields:
+            qs = qs.prefetch_related(
+                Prefetch("aliases", queryset=UserAlias.objects.only("id", "user_id"))
+            )
+        if "groups" in fields:
+            qs = qs.prefetch_related(Prefetch("groups", queryset=UserGroup.objects.only("id")))
+        return qs
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,7 +37,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
     def validate_id(self, value):
-        if UserAlias.objects.filter(id=value).exists():
+        if aliases.resolve(value) is not None:
             raise serializers.ValidationError("UWA ID is already associated with a user")
         return value
 
@@ -35,7 +55,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
     def validate_id(self, value):
         user = self.instance
-        if not user.aliases.filter(id=value).exists():
+        if aliases.resolve(value) != user.id:
             raise serializers.ValidationError("UWA ID is not one of the user's existing aliases")
         return value
 
@@ -46,7 +66,7 @@ class UserAliasCreateSerializer(serializers.ModelSerializer):
         fields = ["id"]
 
     def validate_id(self, value):
-        if UserAlias.objects.filter(id=value).exists():
+        if aliases.resolve(value) is not None:
             raise serializers.ValidationError("UWA ID is already associated with a user")
         return value
 
@@ -64,7 +84,7 @@ class UserAliasDeleteSerializer(serializers.ModelSerializer):
 
     def validate_id(self, value):
         user = self.instance
-        if not user.aliases.filter(id=value).exists():
+        if aliases.resolve(value) != user.id:
             raise serializers.ValidationError("UWA ID is not one of the user's existing aliases")
         if value == user.id:
             raise serializers.ValidationError("Cannot remove the primary UWA ID of a user")
@@ -1,11 +1,20 @@
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import User, UserAlias, Training
+from .models import User, UserAlias, UserGroup, Training, TrainingRecord, ChangeLogEntry
+from .catalog import bump_catalog_version
+from .aliases import bump_aliases_version
+
+
+# post_migrate is sent once per installed app; only seed after our own app migrated.
+# Each receiver is a handful of bulk statements and safe to run on every migrate.
 
 
 @receiver(post_migrate)
 def create_hardcoded_admins(sender, **kwargs):
-    for name, id, *aliases in [
+    if sender.name != "core":
+        return
+
+    admins = [
         ("Christina Fington", "24260355"),
         ("Dani Thomas", "24261923"),
         ("Gayathri Kasunthika Kanakaratne", "24297797"),
@@ -13,19 +22,27 @@ def create_hardcoded_admins(sender, **kwargs):
         ("Siqi Shen", "24117655"),
         ("Wei Dai", "24076678"),
         ("Zhaodong Shen", "24301655", "00117401"),
-    ]:
-        user, _ = User.objects.get_or_create(id=id, defaults={"name": name, "role": "ADMIN"})
-        # ensure role
-        if user.role != "ADMIN":
-            user.role = "ADMIN"
-        user.save()
-        for aid in [id, *aliases]:
-            UserAlias.objects.get_or_create(id=aid, user=user)
+    ]
+
+    # Create missing admins, and ensure role of existing ones
+    User.objects.bulk_create(
+        [User(id=id, name=name, role="ADMIN") for name, id, *_ in admins],
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=["role"],
+    )
+    UserAlias.objects.bulk_create(
+        [UserAlias(id=aid, user_id=id) for _, id, *aliases in admins for aid in [id, *aliases]],
+        ignore_conflicts=True,
+    )
 
 
 @receiver(post_migrate)
 def create_test_trainings(sender, **kwargs):
-    for name, type in (
+    if sender.name != "core":
+        return
+
+    trainings = [
         ("WHS Induction", "LMS"),
         ("WHS Risk Management", "LMS"),
         ("Silica Awareness Training", "EXTERNAL"),
@@ -40,9 +57,120 @@ def create_test_trainings(sender, **kwargs):
         ("Fire Warden Training", "EXTERNAL"),
         ("First Aid", "EXTERNAL"),
         ("Local Area WHS Induction", "TRYBOOKING"),
-    ):
-        training, _ = Training.objects.get_or_create(name=name, defaults={"type": type})
+    ]
+
+    # Only create missing trainings; never overwrite what admins have edited since
+    Training.objects.bulk_create(
+        [
+            Training(
+                name=name,
+                type=type,
+                config={"completance_score": 80} if type == "LMS" else {},
+            )
+            for name, type in trainings
+        ],
+        ignore_conflicts=True,
+    )
+    bump_catalog_version()
+
+
+# ---------------------------------------------------------------------
+# Change feed (GET /changes)
+# Bulk writes (e.g. TrainingRecord.objects.upsert_latest) log their own changes.
+
+TRACKED_MODELS = {
+    User: "user",
+    UserAlias: "alias",
+    UserGroup: "group",
+    Training: "training",
+    TrainingRecord: "record",
+}
+
+# through model -> (feed name, owner field, member field)
+TRACKED_MEMBERSHIPS = {
+    UserGroup.users.through: ("group_users", "usergroup_id", "user_id"),
+    Training.groups.through: ("training_groups", "training_id", "usergroup_id"),
+}
+
+
+def log_saved(sender, instance, raw=False, **kwargs):
+    if not raw:  # skip fixture loading
+        ChangeLogEntry.objects.log(TRACKED_MODELS[sender], [instance.pk])
+
+
+def log_deleted(sender, instance, **kwargs):
+    ChangeLogEntry.objects.log(TRACKED_MODELS[sender], [instance.pk], action="DELETE")
+
+
+def log_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    model, owner_field, member_field = TRACKED_MEMBERSHIPS[sender]
+
+    if action == "pre_clear":
+        # pk_set is not provided for clear(), read it before the rows are gone
+        field, other = (member_field, owner_field) if reverse else (owner_field, member_field)
+        pk_set = set(sender.objects.filter(**{field: instance.pk}).values_list(other, flat=True))
+        action = "post_remove"
+
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+
+    change = "ADD" if action == "post_add" else "REMOVE"
+    if reverse:  # e.g. user.groups.add(...): instance is the member
+        ChangeLogEntry.objects.log(model, pk_set, action=change, related_ids=[instance.pk])
+    else:
+        ChangeLogEntry.objects.log(model, [instance.pk], action=change, related_ids=pk_set)
+
+
+def log_group_memberships_deleted(sender, instance, **kwargs):
+    # Deleting a group drops its memberships without m2m signals; log them as removed
+    # so the feed (and the "ungrouped" archive policy) sees every membership change
+    user_ids = list(instance.users.values_list("id", flat=True))
+    if user_ids:
+        ChangeLogEntry.objects.log(
+            "group_users", [instance.pk], action="REMOVE", related_ids=user_ids
+        )
+    training_ids = list(instance.trainings.values_list("id", flat=True))
+    if training_ids:
+        ChangeLogEntry.objects.log(
+            "training_groups", training_ids, action="REMOVE", related_ids=[instance.pk]
+        )
+
+
+# Connected per sender, so untracked models keep Django's fast-path bulk deletes
+for model in TRACKED_MODELS:
+    post_save.connect(log_saved, sender=model)
+    post_delete.connect(log_deleted, sender=model)
+for through in TRACKED_MEMBERSHIPS:
+    m2m_changed.connect(log_membership, sender=through)
+pre_delete.connect(log_group_memberships_deleted, sender=UserGroup)
+
+
+# ---------------------------------------------------------------------
+# Training catalog invalidation (see catalog.py)
+
+
+def invalidate_catalog(sender, action=None, **kwargs):
+    if action is None or action.startswith("post_"):  # m2m: once per change, not pre + post
+        bump_catalog_version()
+
+
+post_save.connect(invalidate_catalog, sender=Training)
+post_delete.connect(invalidate_catalog, sender=Training)
+# Deleting a group drops its training links without an m2m signal
+post_delete.connect(invalidate_catalog, sender=UserGroup)
+m2m_changed.connect(invalidate_catalog, sender=Training.groups.through)
+
+
+# ---------------------------------------------------------------------
+# Alias resolver invalidation (see aliases.py)
+# New aliases are never cached as missing, so only updates and deletes matter.
+
+
+def invalidate_aliases(sender, created=False, **kwargs):
+    if not created:
+        bump_aliases_version()
+
 
-        if type == "LMS":
-            training.config = {"completance_score": 80}
-            training.save()
+post_save.connect(invalidate_aliases, sender=UserAlias)
+# Also sent for each alias when its user is deleted
+post_delete.connect(invalidate_aliases, sender=UserAlias)
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from core.deadlines import QueryDeadlineExceeded
+from core.models import ChangeLogEntry
+
+# Coalescing counters: "leader" computed a response, "shared" reused one,
+# "wait_timeouts" gave up waiting for the leader and computed their own.
+# Also reported per response in the Server-Timing header, see server_timing().
+stats = Counter()
+
+_lock = threading.Lock()
+_flights = {}  # key -> _Flight
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.finished_at = None
+        self.response = None  # (status, content_type, content) once rendered
+        self.followers = 0  # requests waiting for this flight
+
+
+class _Abandoned:
+    """
+    The leader's disconnect flag for query_deadline(): only set once its client is gone
+    and no follower is waiting for the result, which they would otherwise recompute.
+    """
+
+    def __init__(self, flight, disconnected):
+        self.flight = flight
+        self.disconnected = disconnected
+
+    def is_set(self):
+        return self.disconnected.is_set() and not self.flight.followers
+
+
+def _key(request, per_user):
+    # The latest change cursor makes any committed write start a new flight,
+    # so a shared response is never older than the data it was computed from.
+    cursor = ChangeLogEntry.objects.order_by("-id").values_list("id", flat=True).first()
+    user = request.user
+    return (
+        request.method,
+        request.get_full_path(),
+        request.META.get("HTTP_ACCEPT", ""),
+        user.id if per_user else getattr(user, "role", None),
+        cursor,
+    )
+
+
+def server_timing(role, waited=None):
+    """Server-Timing entry: this response's role, plus the worker's counts so far."""
+    dur = f";dur={waited * 1000:.2f}" if waited is not None else ""
+    desc = f"{role}, {stats['shared']} shared / {stats['leader']} computed"
+    return f'single-flight{dur};desc="{desc}"'
+
+
+def add_server_timing(response, entry):
+    timing = response.get("Server-Timing")
+    response.headers["Server-Timing"] = f"{timing}, {entry}" if timing else entry
+
+
+def single_flight(window=1.0, per_user=False):
+    """
+    Coalesce concurrent identical GET requests on a (DRF) view method.
+
+    Requests with the same path, query string, Accept header, role (or user,
+    with per_user=True) and data version share one computation and one rendered
+    body; a successful result is reused for `window` seconds. Followers wait for the
+    leader for at most QUERY_DEADLINE seconds, then compute their own response.
+    Apply it outside query_deadline(): the leader's 504 is shared with the waiting
+    followers, and its client disconnecting cancels it only when nobody else waits.
+    Only use per_user=False where the payload depends on nothing but the role.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != "GET":
+                return view_method(self, request, *args, **kwargs)
+
+            key = _key(request, per_user)
+            now = time.monotonic()
+            with _lock:
+                # Drop expired results
+                for k in [
+                    k for k, f in _flights.items() if f.finished_at and now - f.finished_at > window
+                ]:
+                    del _flights[k]
+                flight = _flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _flights[key] = _Flight()
+                else:
+                    flight.followers += 1
+
+            if not leader:
+                # Bounded wait: a stuck leader must not hold its followers forever
+                try:
+                    done = flight.done.wait(settings.QUERY_DEADLINE or None)
+                finally:
+                    with _lock:
+                        flight.followers -= 1
+                if not done:
+                    stats["wait_timeouts"] += 1
+                    return view_method(self, request, *args, **kwargs)
+                if flight.response is not None:
+                    stats["shared"] += 1
+                    status, content_type, content = flight.response
+                    response = HttpResponse(content, status=status, content_type=content_type)
+                    response["X-Single-Flight"] = "shared"
+                    add_server_timing(response, server_timing("shared", time.monotonic() - now))
+                    return response
+                # The leader failed: compute our own response
+                return view_method(self, request, *args, **kwargs)
+
+            stats["leader"] += 1
+            scope = getattr(request._request, "scope", {})
+            if scope.get("disconnected"):
+                # query_deadline() below cancels on disconnect only if nobody else waits
+                abandoned = _Abandoned(flight, scope["disconnected"])
+                request._request.scope = {**scope, "disconnected": abandoned}
+            try:
+                try:
+                    response = view_method(self, request, *args, **kwargs)
+                except QueryDeadlineExceeded as exc:
+                    # Followers would hit the same deadline, give them this 504
+                    response = self.handle_exception(exc)
+                # Render once here so followers can reuse the bytes
+                response = self.finalize_response(request, response, *args, **kwargs)
+                response.render()
+                response["X-Single-Flight"] = "leader"
+                add_server_timing(response, server_timing("leader"))
+                if response.status_code in (200, 504):
+                    flight.response = (
+                        response.status_code,
+                        response["Content-Type"],
+                        response.content,
+                    )
+                return response
+            finally:
+                with _lock:
+                    failed = flight.response is None or flight.response[0] != 200
+                    if failed and _flights.get(key) is flight:
+                        del _flights[key]  # errors are only shared with current followers
+                    flight.finished_at = time.monotonic()
+                flight.done.set()
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,98 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase
+
+from core.catalog import catalog
+from core.connectors import sync
+from core.models import SyncWatermark, Training, TrainingRecord, User
+
+
+class FakeSourceSyncTests(TestCase):
+    """sync() against the local NDJSON source (FakeConnector)."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "source.ndjson"
+        self.path.touch()
+        self.training = Training.objects.create(
+            name="Synced Training",
+            type="EXTERNAL",
+            config={"sync": {"source": "fake", "path": str(self.path)}},
+        )
+        # Rolled-back tests reuse catalog version numbers, so drop the process-local copy
+        catalog.invalidate()
+        self.cursor = 0
+        for user_id in ("10000001", "10000002"):
+            self.create_user(user_id)
+
+    def create_user(self, user_id):
+        user = User.objects.create(id=user_id, name=f"User {user_id}")
+        user.aliases.create(id=user_id)
+
+    def append(self, user, timestamp, **details):
+        self.cursor += 1
+        line = {"cursor": self.cursor, "user": user, "timestamp": timestamp, "details": details}
+        with self.path.open("a") as file:
+            file.write(json.dumps(line) + "\n")
+
+    def sync(self):
+        errors = sync(trainings=[str(self.training.id)], log=lambda message: None)
+        self.assertEqual(errors, {})
+        return SyncWatermark.objects.get(training=self.training)
+
+    def records(self):
+        return dict(
+            TrainingRecord.objects.filter(training=self.training).values_list("user_id", "details")
+        )
+
+    def test_incremental_sync(self):
+        self.append("10000001", "2025-01-01", run=1)
+        self.assertEqual(self.sync().cursor, "1")
+        self.assertEqual(self.records(), {"10000001": {"run": 1}})
+
+        self.append("10000002", "2025-01-02", run=2)
+        watermark = self.sync()
+        self.assertEqual(watermark.cursor, "2")
+        self.assertEqual(watermark.error, "")
+        self.assertEqual(self.records(), {"10000001": {"run": 1}, "10000002": {"run": 2}})
+
+        # Nothing new: nothing is fetched, the watermark stays
+        self.assertEqual(self.sync().cursor, "2")
+
+    def test_newest_wins(self):
+        self.append("10000001", "2025-06-01", version="newer")
+        self.append("10000001", "2025-01-01", version="older")
+        self.sync()
+        self.assertEqual(self.records(), {"10000001": {"version": "newer"}})
+
+        self.append("10000001", "2024-01-01", version="oldest")
+        self.sync()
+        self.assertEqual(self.records(), {"10000001": {"version": "newer"}})
+
+        self.append("10000001", "2026-01-01", version="newest")
+        self.sync()
+        self.assertEqual(self.records(), {"10000001": {"version": "newest"}})
+
+    def test_skipped_items(self):
+        self.append("10000001", "not a date")
+        self.append("10000003", "2025-01-01", early=True)  # user not created yet
+        watermark = self.sync()
+        self.assertEqual(watermark.cursor, "2")
+        self.assertEqual(self.records(), {})
+        self.assertIn("1 skipped: 'timestamp'", watermark.error)
+        self.assertIn("1 skipped: User not found", watermark.error)
+        self.assertEqual([item["user"] for item in watermark.pending], ["10000003"])
+
+        # Still unknown: kept for the next run, never fetched twice
+        watermark = self.sync()
+        self.assertEqual(len(watermark.pending), 1)
+
+        # Once the user exists the kept item is written, although the cursor moved past it
+        self.create_user("10000003")
+        watermark = self.sync()
+        self.assertEqual(self.records(), {"10000003": {"early": True}})
+        self.assertEqual(watermark.pending, [])
+        self.assertEqual(watermark.error, "")
@@ -1,14 +1,24 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from .views.users import UserViewSet
 from .views.groups import UserGroupViewSet
 from .views.trainings import TrainingViewSet
 from .views.records import TrainingRecordViewSet
+from .views.compliance import ComplianceViewSet
+from .views.changes import ChangeViewSet
+from .views.audit import AuditViewSet
+from .views.avatars import avatar
 
 router = DefaultRouter(trailing_slash=False)
 router.register("users", UserViewSet, basename="user")
 router.register("groups", UserGroupViewSet, basename="group")
 router.register("trainings", TrainingViewSet, basename="training")
 router.register("training-records", TrainingRecordViewSet, basename="training-record")
+router.register("compliance", ComplianceViewSet, basename="compliance")
+router.register("changes", ChangeViewSet, basename="change")
+router.register("audit", AuditViewSet, basename="audit")
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path("avatars/<str:digest>.svg", avatar, name="avatar"),
+]
@@ -1,10 +1,13 @@
 import csv
 from typing import List, Tuple, IO, Sequence
-from openpyxl import load_workbook
 
+from django.db.models import Count, F, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime, parse_date
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache, partial
+from operator import itemgetter
 
 
 # Common column names
@@ -15,32 +18,87 @@ COMPLETEION_DATE_COL = "Completion Date"
 SCORE_COL = "Score"
 
 
-def parse_xlsx(file: IO[bytes], columns: Sequence[str]) -> List[Tuple[int, ...]]:
+def normalise_header(value) -> str:
+    """Header cells are matched ignoring case and extra whitespace."""
+    return " ".join(str(value).split()).lower() if value is not None else ""
+
+
+def _pick_columns(header, rows, columns):
     """
-    Parse an .xlsx file and return rows as (row_index, ...columns...).
-    Example: parse_xlsx(file, [UID_COL, NAME_COL])
+    Select `columns` (by normalised header) from an iterator of row tuples.
+    Returns (row_indices, [values of each column]); blank rows are skipped.
+    Raises ValueError if a column is missing.
+    """
+    headers = [normalise_header(h) for h in header]
+    idxs = [headers.index(normalise_header(col)) for col in columns]
+    pick = itemgetter(*idxs) if len(idxs) > 1 else lambda row: (row[idxs[0]],)
+    width = max(idxs) + 1
+
+    row_idxs, picked = [], []
+    for row_idx, row in enumerate(rows, start=2):  # start=2 for consistency with Excel
+        if not any(row):
+            continue
+        if len(row) < width:  # short csv line
+            row = (*row, *([None] * (width - len(row))))
+        row_idxs.append(row_idx)
+        picked.append(pick(row))
+
+    return row_idxs, [list(col) for col in zip(*picked)] or [[] for _ in columns]
+
+
+def read_xlsx_columns(file: IO[bytes], columns: Sequence[str]) -> Tuple[List[int], List[list]]:
+    """
+    Read columns of an .xlsx file, keeping native cell types (datetime, int, float, str).
+    Example: read_xlsx_columns(file, [UID_COL, NAME_COL]) -> ([2, 3], [[uid, uid], [name, name]])
     """
+    # openpyxl is slow to import and only needed by the batch endpoints
+    from openpyxl import load_workbook
+
     ws = load_workbook(file, read_only=True, data_only=True).active
-    headers = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
+    rows = ws.iter_rows(values_only=True)
+    return _pick_columns(next(rows), rows, columns)
+
+
+def read_csv_columns(file: IO[bytes], columns: Sequence[str]) -> Tuple[List[int], List[list]]:
+    """
+    Read columns of a .csv file (all values are strings).
+    Example: read_csv_columns(file, [UID_COL, NAME_COL]) -> ([2, 3], [[uid, uid], [name, name]])
+    """
+    rows = csv.reader(file.read().decode("utf-8-sig").splitlines())
+    return _pick_columns(next(rows), rows, columns)
+
+
+def cell_str(value) -> str:
+    """Spreadsheet cell as text; whole floats (IDs typed as numbers) lose their `.0`."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def column_str(values) -> List[str]:
+    return [v.strip() if type(v) is str else cell_str(v) for v in values]
+
 
-    idxs = [headers.index(col) for col in columns]
+def _as_rows(row_idxs, columns):
+    return list(zip(row_idxs, *map(column_str, columns)))
 
-    return [
-        (row_idx, *(str(row[i]).strip() for i in idxs))
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2)
-    ]
+
+def parse_xlsx(file: IO[bytes], columns: Sequence[str]) -> List[Tuple[int, ...]]:
+    """
+    Parse an .xlsx file and return rows as (row_index, ...columns...) of strings.
+    Example: parse_xlsx(file, [UID_COL, NAME_COL])
+    """
+    return _as_rows(*read_xlsx_columns(file, columns))
 
 
 def parse_csv(file: IO[bytes], columns: Sequence[str]) -> List[Tuple[int, ...]]:
     """
-    Parse a .csv file and return rows as (row_index, ...columns...).
+    Parse a .csv file and return rows as (row_index, ...columns...) of strings.
     Example: parse_csv(file, [UID_COL, NAME_COL])
     """
-    reader = csv.DictReader(file.read().decode("utf-8").splitlines())
-    return [
-        (row_idx, *(row[col].strip() for col in columns))
-        for row_idx, row in enumerate(reader, start=2)  # start=2 for consistency with Excel
-    ]
+    return _as_rows(*read_csv_columns(file, columns))
 
 
 def paginate_qs(qs, query_params, page_size_default, Serializer, Response):
@@ -59,7 +117,7 @@ def paginate_qs(qs, query_params, page_size_default, Serializer, Response):
     total_pages = (total_items + page_size - 1) // page_size
     start = (page - 1) * page_size
     end = start + page_size
-    items = [Serializer(v).data for v in qs[start:end]]
+    items = Serializer(qs[start:end], many=True).data
 
     return Response(
         {
@@ -72,6 +130,38 @@ def paginate_qs(qs, query_params, page_size_default, Serializer, Response):
     )
 
 
+def count_subquery(qs, group_by, expression=None):
+    """
+    Correlated COUNT subquery for annotations: `qs` filters on OuterRef and `group_by` is
+    the field it is correlated on. One value per outer row, 0 when there are no rows.
+    """
+    counted = qs.order_by().values(group_by).annotate(n=expression or Count("*")).values("n")
+    return Coalesce(Subquery(counted[:1]), 0)
+
+
+def list_response(qs, params, kw, Serializer, sortable, Response):
+    """
+    Response of a list endpoint: `qs` prepared for `Serializer` (a list serializer with
+    STATS and prepare_queryset, `kw` from dynamic_fields()), ordered by `order_by`, one
+    of `sortable` or a statistic (prefix - for descending, default name), and paginated
+    when page / page_size is given.
+    """
+    order_by = params.get("order_by", "name")
+    field = order_by.lstrip("-")
+    if field not in {*sortable} | Serializer.STATS:
+        field, order_by = "name", "name"
+    fields = kw["fields"]
+    if fields is not None and field in Serializer.STATS:
+        fields = {*fields, field}  # sorting needs the statistic even when not returned
+    qs = Serializer.prepare_queryset(qs, fields, kw["expand"])
+    ordering = F(field).desc(nulls_last=True) if order_by[0] == "-" else F(field).asc()
+    qs = qs.order_by(ordering, "name", "id")
+
+    if "page" in params or "page_size" in params:
+        return paginate_qs(qs, params, 20, partial(Serializer, **kw), Response)
+    return Response(Serializer(qs, many=True, **kw).data)
+
+
 def parse_to_aware_datetime(value):
     """
     Safely parse a string into a timezone-aware datetime.
@@ -101,3 +191,40 @@ def parse_to_aware_datetime(value):
     except Exception:
         # Catch any unexpected parsing or type errors
         return None
+
+
+@lru_cache(maxsize=4096)
+def cell_to_aware_datetime(value):
+    """
+    parse_to_aware_datetime() for spreadsheet cells, which may also be native
+    datetime / date values. Memoised: exports repeat the same few dates across many rows.
+    """
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, date):
+        dt = datetime.combine(value, datetime.min.time())
+    else:
+        return parse_to_aware_datetime(cell_str(value))
+
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone.get_default_timezone())
+    return dt
+
+
+def cell_to_int(value):
+    """Integer cell value (int, whole float or numeric text), or None if it is not one."""
+    if type(value) is str:
+        try:
+            return int(value)  # int() ignores surrounding whitespace
+        except ValueError:
+            return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(cell_str(value))
+    except ValueError:
+        return None
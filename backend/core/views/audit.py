@@ -0,0 +1,57 @@
+from rest_framework import viewsets
+from rest_framework.response import Response
+
+from core.aliases import aliases
+from core.models import AuditEvent
+from core.permissions import IsAdmin
+
+
+class AuditViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdmin]
+
+    # GET /audit?actor=&model=&object_id=&action=&before=<cursor>&limit=<n>
+    def list(self, request):
+        """
+        Audit events, newest first. Page back with `before` = the returned cursor.
+        Buffered events show up within AUDIT_FLUSH_INTERVAL seconds.
+        """
+        params = request.query_params
+        try:
+            limit = min(int(params.get("limit", 100)), 1000)
+            assert limit >= 1
+        except Exception:
+            return Response({"error": "Invalid limit"}, status=400)
+
+        qs = AuditEvent.objects.all()
+        actor = params.get("actor")
+        if actor:
+            qs = qs.filter(actor=aliases.resolve(actor) or actor)
+        for param in ("model", "object_id", "action"):
+            value = params.get(param)
+            if value:
+                qs = qs.filter(**{param: value})
+        before = params.get("before")
+        if before:
+            try:
+                qs = qs.filter(id__lt=int(before))
+            except ValueError:
+                return Response({"error": "Invalid cursor"}, status=400)
+
+        events = list(qs.order_by("-id")[: limit + 1])
+        has_more = len(events) > limit
+        events = events[:limit]
+
+        items = [
+            {
+                "cursor": event.id,
+                "timestamp": event.timestamp,
+                "actor": event.actor,
+                "action": event.action,
+                "model": event.model,
+                "id": event.object_id,
+                "changes": event.changes,
+            }
+            for event in events
+        ]
+        cursor = events[-1].id if has_more else None
+        return Response({"cursor": cursor, "has_more": has_more, "items": items})
@@ -0,0 +1,21 @@
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import etag, require_GET
+
+from core.avatars import get_avatar
+
+
+# GET /avatars/{digest}.svg
+# Plain Django view: public (used in <img> tags, which send no token) and not JSON.
+# The URL holds no personal data, the name is looked up from the digest.
+@require_GET
+@etag(lambda request, digest: digest)
+def avatar(request, digest):
+    content = get_avatar(digest)
+    if content is None:
+        raise Http404
+
+    response = HttpResponse(content, content_type="image/svg+xml")
+    # The URL changes whenever the content does
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["Content-Security-Policy"] = "default-src 'none'; style-src 'unsafe-inline'"
+    return response
@@ -0,0 +1,87 @@
+from rest_framework import viewsets
+from rest_framework.response import Response
+
+from core.models import ChangeLogEntry, User, UserAlias, UserGroup, Training, TrainingRecord
+from core.permissions import IsAdmin
+from core.serializers.groups import UserGroupSerializer
+from core.serializers.records import TrainingRecordReadSerializer
+from core.serializers.trainings import TrainingSerializer
+from core.serializers.users import UserSerializer
+
+
+def alias_data(qs):
+    return {alias.id: {"id": alias.id, "user": alias.user_id} for alias in qs}
+
+
+def serialized(Serializer):
+    def load(qs):
+        qs = Serializer.prepare_queryset(qs)
+        return {obj.pk: Serializer(obj).data for obj in qs}
+
+    return load
+
+
+# feed name -> (model, loader returning {pk: data})
+FEED_MODELS = {
+    "user": (User, serialized(UserSerializer)),
+    "alias": (UserAlias, alias_data),
+    "group": (UserGroup, serialized(UserGroupSerializer)),
+    "training": (Training, serialized(TrainingSerializer)),
+    "record": (TrainingRecord, serialized(TrainingRecordReadSerializer)),
+}
+
+
+class ChangeViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdmin]
+
+    # GET /changes?since=<cursor>&limit=<n>
+    def list(self, request):
+        """
+        Changes after `since`, oldest first. Without `since`, only the current
+        cursor is returned: take it before a full download, then poll with it.
+        """
+        try:
+            limit = min(int(request.query_params.get("limit", 500)), 5000)
+            assert limit >= 1
+        except Exception:
+            return Response({"error": "Invalid limit"}, status=400)
+
+        since = request.query_params.get("since")
+        if since is None:
+            latest = ChangeLogEntry.objects.order_by("-id").values_list("id", flat=True).first()
+            return Response({"cursor": latest or 0, "has_more": False, "items": []})
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({"error": "Invalid cursor"}, status=400)
+
+        entries = list(ChangeLogEntry.objects.filter(id__gt=since).order_by("id")[: limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # Current state of created / updated objects, one query per model
+        data = {}
+        for name, (Model, load) in FEED_MODELS.items():
+            pks = {e.object_id for e in entries if e.model == name and e.action == "UPDATE"}
+            if pks:
+                loaded = load(Model.objects.filter(pk__in=pks))
+                data[name] = {str(pk): value for pk, value in loaded.items()}
+
+        items = []
+        for entry in entries:
+            item = {
+                "cursor": entry.id,
+                "model": entry.model,
+                "id": entry.object_id,
+                "action": entry.action,
+                "timestamp": entry.timestamp,
+            }
+            if entry.related_id:
+                item["related_id"] = entry.related_id
+            if entry.action == "UPDATE":
+                # None if the object was deleted later (a DELETE entry follows)
+                item["data"] = data.get(entry.model, {}).get(entry.object_id)
+            items.append(item)
+
+        cursor = entries[-1].id if entries else since
+        return Response({"cursor": cursor, "has_more": has_more, "items": items})
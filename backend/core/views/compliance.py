@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core.compliance import STATUSES, STATUS_CODES, compliance_matrix
+from core.deadlines import query_deadline
+from core.aliases import aliases
+from core.models import ComplianceSnapshot, User
+from core.permissions import IsAdmin
+from core.serializers.compliance import ComplianceMatrixSerializer
+
+
+class ComplianceViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdmin]
+
+    # POST /compliance/matrix
+    @action(detail=False, methods=["post"], url_path="matrix")
+    @query_deadline()
+    def matrix(self, request):
+        """
+        Users x trainings status matrix for a list of UWA IDs or a group.
+
+        dense:   {"users": [...], "trainings": [...], "matrix": [[status or null, ...], ...]}
+                 (null == training not assigned to the user)
+        compact: {"users": [...], "trainings": [...], "statuses": [...],
+                  "cells": {"user": [i, ...], "training": [j, ...], "status": [code, ...]}}
+                 (assigned pairs only, status code == index in "statuses")
+        """
+        serializer = ComplianceMatrixSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if "group" in data:
+            user_ids = list(
+                User.objects.filter(groups=data["group"])
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+        else:
+            resolved = aliases.resolve_many(data["users"])
+            missing = [uid for uid in data["users"] if uid not in resolved]
+            if missing:
+                return Response(
+                    {"error": f"Unknown UWA ID(s): {', '.join(missing)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            # Keep request order, drop duplicates (two aliases of the same user)
+            user_ids = list(dict.fromkeys(resolved[uid] for uid in data["users"]))
+
+        trainings, cells = compliance_matrix(user_ids)
+        training_ids = [training.id for training in trainings]
+
+        if data["encoding"] == "compact":
+            user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+            training_index = {training_id: j for j, training_id in enumerate(training_ids)}
+            pairs = sorted(
+                (user_index[user_id], training_index[training_id], STATUS_CODES[cell])
+                for (user_id, training_id), cell in cells.items()
+            )
+            return Response(
+                {
+                    "users": user_ids,
+                    "trainings": training_ids,
+                    "statuses": STATUSES,
+                    "cells": {
+                        "user": [i for i, _, _ in pairs],
+                        "training": [j for _, j, _ in pairs],
+                        "status": [code for _, _, code in pairs],
+                    },
+                }
+            )
+
+        return Response(
+            {
+                "users": user_ids,
+                "trainings": training_ids,
+                "matrix": [
+                    [cells.get((user_id, training_id)) for training_id in training_ids]
+                    for user_id in user_ids
+                ],
+            }
+        )
+
+    # GET /compliance/trends?from=<date>&to=<date>&training=<id>&group=<id>
+    @action(detail=False, methods=["get"], url_path="trends")
+    def trends(self, request):
+        """
+        Status counts over time, read from the snapshots of `manage.py snapshot_compliance`
+        (default: the last 12 months). Columnar: one entry per snapshot date.
+        """
+        params = request.query_params
+        today = timezone.localdate()
+        try:
+            end = parse_date(params["to"]) if "to" in params else today
+            start = parse_date(params["from"]) if "from" in params else end - timedelta(days=365)
+            assert start and end
+        except (ValueError, AssertionError):
+            return Response({"error": "Invalid date, expected YYYY-MM-DD"}, status=400)
+
+        try:
+            trend = ComplianceSnapshot.objects.trend(
+                start, end, training=params.get("training"), group=params.get("group")
+            )
+        except ValidationError:  # malformed UUID
+            return Response({"error": "Invalid training or group"}, status=400)
+
+        dates = sorted(trend)
+        counts = {
+            name: [trend[date].get(code, 0) for date in dates] for code, name in enumerate(STATUSES)
+        }
+        totals = [sum(trend[date].values()) for date in dates]
+        return Response(
+            {
+                "dates": dates,
+                "counts": counts,
+                "compliance": [
+                    round(100 * passed / total, 1) if total else None
+                    for passed, total in zip(counts["PASSED"], totals)
+                ],
+            }
+        )
@@ -3,12 +3,18 @@ from django.db import transaction
 from rest_framework import viewsets, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from core.audit import audit, diff
 from core.models import UserGroup, Training
 from core.serializers.groups import (
     UserGroupSerializer,
+    UserGroupListSerializer,
     GroupBatchManageUsersSerializer,
     GroupBatchManageTrainingsSerializer,
 )
+from core.serializers.dynamic import dynamic_fields
+from core.utils import list_response
+from core.deadlines import query_deadline
+from core.writer import writer
 
 
 # Lightweight training row serializer for the list endpoint
@@ -23,6 +29,46 @@ class UserGroupViewSet(viewsets.ModelViewSet):
     queryset = UserGroup.objects.all()
     serializer_class = UserGroupSerializer
 
+    def get_queryset(self):
+        if self.request.method != "GET":
+            return self.queryset.all()
+        return UserGroupSerializer.prepare_queryset(self.queryset, **dynamic_fields(self.request))
+
+    def get_serializer(self, *args, **kwargs):
+        # Sparse fieldsets only apply to reads, never to the fields being written
+        if self.request.method == "GET":
+            kwargs.update(dynamic_fields(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+    # GET /groups  (paginated when page / page_size is given)
+    @query_deadline()
+    def list(self, request):
+        params = request.query_params
+        kw = dynamic_fields(request)
+        qs = UserGroup.objects.all()
+
+        name_kw = params.get("name")
+        if name_kw:
+            for keyword in name_kw.split():
+                qs = qs.filter(name__icontains=keyword)
+
+        sortable = {"name", "timestamp"}
+        return list_response(qs, params, kw, UserGroupListSerializer, sortable, Response)
+
+    def perform_create(self, serializer):
+        group = writer.run(serializer.save)
+        audit.record(self.request.user, "CREATE", "group", [group.id], serializer.validated_data)
+
+    def perform_update(self, serializer):
+        changes = diff(serializer.instance, serializer.validated_data)
+        writer.run(serializer.save)
+        audit.record(self.request.user, "UPDATE", "group", [serializer.instance.id], changes)
+
+    def perform_destroy(self, instance):
+        group_id = instance.id
+        writer.run(instance.delete)
+        audit.record(self.request.user, "DELETE", "group", [group_id])
+
     # GET /groups/{id}/trainings/
     @action(detail=True, methods=["get"])
     def trainings(self, request, pk=None):
@@ -38,12 +84,15 @@ class UserGroupViewSet(viewsets.ModelViewSet):
         serializer = GroupBatchManageUsersSerializer(data=request.data, many=True)
         serializer.is_valid(raise_exception=True)
 
-        with transaction.atomic():
+        @transaction.atomic
+        def save():
             for item in serializer.validated_data:
                 group = item["group"]
                 group.users.add(*item["add"])
                 group.users.remove(*item["remove"])
 
+        writer.run(save)
+        self.audit_members(request, serializer.validated_data, "users")
         return Response()
 
     # PATCH /groups/batch/trainings
@@ -52,10 +101,22 @@ class UserGroupViewSet(viewsets.ModelViewSet):
         serializer = GroupBatchManageTrainingsSerializer(data=request.data, many=True)
         serializer.is_valid(raise_exception=True)
 
-        with transaction.atomic():
+        @transaction.atomic
+        def save():
             for item in serializer.validated_data:
                 group = item["group"]
                 group.trainings.add(*item["add"])
                 group.trainings.remove(*item["remove"])
 
+        writer.run(save)
+        self.audit_members(request, serializer.validated_data, "trainings")
         return Response()
+
+    @staticmethod
+    def audit_members(request, items, field):
+        """One ADD / REMOVE audit event per group, with the IDs of the added / removed members."""
+        for item in items:
+            for key in ("add", "remove"):
+                if item[key]:
+                    members = {field: [member.pk for member in item[key]]}
+                    audit.record(request.user, key.upper(), "group", [item["group"].id], members)
@@ -4,214 +4,375 @@ from rest_framework.decorators import action
 from rest_framework import viewsets
 from django.http import Http404
 from django.db import transaction
+from collections import Counter, defaultdict
+from functools import partial
+import hashlib
+import json
 
-from core.models import UserAlias, TrainingRecord
+from core.archive import MergedRecords, wants_archived
+from core.audit import audit, diff
+from core.models import ArchivedTrainingRecord, IdempotencyKey, TrainingRecord
+from core.aliases import aliases, resolve_users
 from core.serializers.users import UserRowSerializer
 from core.serializers.records import (
     TrainingRecordReadSerializer,
     TrainingRecordCreateSerializer,
     TrainingRecordPatchSerializer,
 )
+from core.serializers.dynamic import dynamic_fields
 from core.permissions import IsAdmin
-from core.utils import (
-    COMPLETEION_DATE_COL,
-    NAME_COL,
-    SCORE_COL,
-    UID_COL,
-    paginate_qs,
-    parse_csv,
-    parse_xlsx,
-    parse_to_aware_datetime,
+from core.utils import paginate_qs, parse_to_aware_datetime
+from core.imports import (
+    MAX_BULK_BYTES,
+    MAX_BULK_ITEMS,
+    NDJSON_CONTENT_TYPES,
+    UploadError,
+    bulk_record,
+    collect_files,
+    match_training,
+    parse_many,
+    parse_manifest,
+    parse_rows,
 )
-from core.models import Training  # Import here if not already imported
+from core.catalog import catalog
+from core.deadlines import query_deadline
+from core.singleflight import single_flight
+from core.writer import writer
+
+
+# ?order_by value (prefix "-" for descending) -> field
+RECORD_ORDERING = {
+    "timestamp": "timestamp",
+    "user_id": "user__id",
+    "user_name": "user__name",
+    "training": "training__name",
+}
 
 
 class TrainingRecordViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAdmin]
 
-    def get_object(self):
+    def get_object(self, queryset=None):
         pk = self.kwargs.get("pk")
+        if queryset is None:
+            queryset = TrainingRecord.objects.all()
         try:
-            record = TrainingRecord.objects.get(pk=pk)
+            record = queryset.get(pk=pk)
         except TrainingRecord.DoesNotExist:
             raise Http404
         return record
 
     # GET /training-records
+    @single_flight()
+    @query_deadline()
     def list(self, request):
-        qs = TrainingRecord.objects.all()
-
-        order_by = request.query_params.get("order_by", "-timestamp")
-        if order_by in {
-            "timestamp",
-            "-timestamp",
-            "user_id",
-            "-user_id",
-            "user_name",
-            "-user_name",
-            "training",
-            "-training",
-        }:
-            if order_by == "user_id":
-                qs = qs.order_by("user__id")
-            elif order_by == "-user_name":
-                qs = qs.order_by("-user__id")
-            elif order_by == "user_name":
-                qs = qs.order_by("user__name")
-            elif order_by == "-user_name":
-                qs = qs.order_by("-user__name")
-            elif order_by == "training":
-                qs = qs.order_by("training__name")
-            elif order_by == "-training":
-                qs = qs.order_by("-training__name")
-            else:
-                qs = qs.order_by(order_by)
+        params = request.query_params
+        kw = dynamic_fields(request)
+
+        order_by = params.get("order_by") or "-timestamp"
+        field = RECORD_ORDERING.get(order_by.lstrip("-"))
+        order_by = (order_by[0] + field if order_by[0] == "-" else field) if field else None
+
+        qs = self.filter_records(TrainingRecord.objects.all(), params)
+        qs = TrainingRecordReadSerializer.prepare_queryset(qs, **kw)
+        if wants_archived(request):
+            archived = self.filter_records(ArchivedTrainingRecord.objects.all(), params)
+            archived = TrainingRecordReadSerializer.prepare_archived(archived, **kw)
+            qs = MergedRecords(qs, archived, order_by or "-timestamp")
+        elif order_by:
+            qs = qs.order_by(order_by)
+
+        serializer = partial(TrainingRecordReadSerializer, **kw)
+        return paginate_qs(qs, params, 20, serializer, Response)
 
-        training = request.query_params.get("training")
+    @staticmethod
+    def filter_records(qs, params):
+        """List filters, shared by TrainingRecord and ArchivedTrainingRecord querysets."""
+        training = params.get("training")
         if training:
             qs = qs.filter(training_id=training)
 
         # [from, to)
-        start = request.query_params.get("from")
-        start = parse_to_aware_datetime(start)
+        start = parse_to_aware_datetime(params.get("from"))
         if start:
             qs = qs.filter(timestamp__gte=start)
-        end = request.query_params.get("to")
-        end = parse_to_aware_datetime(end)
+        end = parse_to_aware_datetime(params.get("to"))
         if end:
             qs = qs.filter(timestamp__lt=end)
 
-        user_id = request.query_params.get("user_id")
+        user_id = params.get("user_id")
         if user_id:
             qs = qs.filter(user__aliases__id__icontains=user_id).distinct()
 
-        user_name = request.query_params.get("user_name")
+        user_name = params.get("user_name")
         if user_name:
             keywords = user_name.split()
             for kw in keywords:
                 qs = qs.filter(user__name__icontains=kw)
-
-        return paginate_qs(qs, request.query_params, 20, TrainingRecordReadSerializer, Response)
+        return qs
 
     # POST /training-records
     def create(self, request):
-        user_id = request.data.get("user")
-        alias = UserAlias.objects.filter(id=user_id).first()
-        if alias:
-            request.data["user"] = alias.user.id
+        user_id = aliases.resolve(request.data.get("user"))
+        if user_id:
+            request.data["user"] = user_id
         serializer = TrainingRecordCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        record = serializer.save()
+        data = serializer.validated_data
+        current = TrainingRecord.objects.filter(
+            user=data["user"], training=data["training"]
+        ).first()
+        record = writer.run(serializer.save)
+        if serializer.outcome == "updated" and current is not None:
+            changes = diff(
+                current, {k: v for k, v in data.items() if k in ("timestamp", "details")}
+            )
+            audit.record(request.user, "UPDATE", "record", [record.id], changes)
+        else:
+            action = {"created": "CREATE", "updated": "UPDATE", "history": "HISTORY"}
+            audit.record(request.user, action[serializer.outcome], "record", [record.id], data)
         read_serializer = TrainingRecordReadSerializer(record)
         return Response(read_serializer.data, status=status.HTTP_201_CREATED)
 
     # POST /training-records/batch
     @action(detail=False, methods=["post"], url_path="batch")
     def batch(self, request):
-        try:
-            training_id = request.data.get("training")
-            training = Training.objects.get(pk=training_id)
-        except Training.DoesNotExist:
+        training = catalog.get(request.data.get("training"))
+        if training is None:
             return Response({"detail": "Training not found."}, status=status.HTTP_404_NOT_FOUND)
 
         file = request.FILES.get("file")
-        if not file:
+        if not file or not file.name.lower().endswith((".csv", ".xlsx")):
             return Response(
                 {"error": "Please upload a .csv or .xlsx file"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Determine file type
-        name = file.name.lower()
-        if name.endswith(".csv"):
-            parser = parse_csv
-        elif name.endswith(".xlsx"):
-            parser = parse_xlsx
-        else:
+        rows, error = parse_rows(file.name, file.read(), training.type)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = writer.run(self.save_rows, [(training, rows, "")])
+        if response.status_code == status.HTTP_200_OK:
+            audit.record(request.user, "IMPORT", "training", [training.id], {"rows": len(rows)})
+        return response
+
+    # POST /training-records/import
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_files(self, request):
+        """
+        Several .csv/.xlsx files and/or .zip archives of them, one file per training.
+        Files are matched to trainings by the optional manifest, else by file name.
+        """
+        try:
+            files, manifest = collect_files(request.FILES.getlist("files"))
+            manifest = parse_manifest(request.data.get("manifest") or manifest)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not files:
             return Response(
-                {"error": "Please upload a .csv or .xlsx file"},
+                {"error": "Please upload .csv, .xlsx or .zip files"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if training.type == "LMS":
-            cols = [UID_COL, NAME_COL, COMPLETEION_DATE_COL, SCORE_COL]
+        trainings = catalog.all().values()
+        matched = []
+        for name, content in files:
+            training = match_training(name, manifest, trainings)
+            if training is None:
+                return Response(
+                    {"error": f"{name}: No training matches this file"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            matched.append((training, name, content))
+
+        # CPU-bound parsing runs in the process pool, writes stay in this request
+        results = parse_many(
+            [(name, content, training.type) for training, name, content in matched]
+        )
+
+        batches = []
+        for (training, name, _), (rows, error) in zip(matched, results):
+            if error:
+                return Response({"error": f"{name}: {error}"}, status=status.HTTP_400_BAD_REQUEST)
+            batches.append((training, rows, f"{name}: "))
+
+        response = writer.run(self.save_rows, batches)
+        if response.status_code == status.HTTP_200_OK:
+            response.data = {"files": {name: training.id for training, name, _ in matched}}
+            for (training, name, _), (_, rows, _) in zip(matched, batches):
+                changes = {"rows": len(rows), "file": name}
+                audit.record(request.user, "IMPORT", "training", [training.id], changes)
+        return response
+
+    # POST /training-records/bulk
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Upsert records of any trainings from an NDJSON (streamed line by line) or JSON array body
+        of {user, training, timestamp, details}. Newest wins; per-line results are returned.
+        A retried request with the same Idempotency-Key replays the stored response.
+        """
+        key = request.headers.get("Idempotency-Key")
+        stored = key and IdempotencyKey.objects.lookup(request.user, key)
+
+        too_large = Response(
+            {"error": f"Request body must be at most {MAX_BULK_BYTES // 2**20} MB"},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        if int(request.META.get("CONTENT_LENGTH") or 0) > MAX_BULK_BYTES:
+            return too_large
+
+        digest = hashlib.sha256()
+        media_type = request.content_type.split(";")[0].strip().lower()
+        if media_type in NDJSON_CONTENT_TYPES:
+            items, size = [], 0
+            for line in request.stream or ():
+                size += len(line)
+                if size > MAX_BULK_BYTES:
+                    return too_large
+                digest.update(line)
+                items.append(line.strip())
         else:
-            cols = [UID_COL, NAME_COL, COMPLETEION_DATE_COL, COMPLETEION_DATE_COL]
+            # Not request.body, which is capped at DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB)
+            body = request.stream.read(MAX_BULK_BYTES + 1) if request.stream else b""
+            if len(body) > MAX_BULK_BYTES:
+                return too_large
+            digest.update(body)
+            try:
+                items = json.loads(body)
+                assert isinstance(items, list)
+            except Exception:
+                return Response(
+                    {"error": "Body must be a JSON array or NDJSON"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-        try:
-            rows = parser(file, cols)
-        except Exception:
+        if len(items) > MAX_BULK_ITEMS:
             return Response(
-                {
-                    "error": (
-                        "Failed to parse uploaded file. "
-                        f"File must include all expected columns: {cols}."
-                    )
-                },
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": f"At most {MAX_BULK_ITEMS} records per request"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             )
 
-        with transaction.atomic():  # rollback everything if any row fails
-            for row_idx, user_id, name, date, score in rows:
-                alias = UserAlias.objects.filter(id=user_id).first()
-                instance = alias.user if alias else None
-
-                serializer = UserRowSerializer(
-                    instance=instance,
-                    data={"id": user_id, "name": name},
-                    partial=True,
+        if stored:
+            if stored.request_hash != digest.hexdigest():
+                return Response(
+                    {"error": "Idempotency-Key was already used with a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 )
+            return Response(stored.response, headers={"Idempotent-Replayed": "true"})
 
-                if not serializer.is_valid():
-                    transaction.set_rollback(True)
-
-                    # Show first error message
-                    message = ""
-                    for field, messages in serializer.errors.items():
-                        for msg in messages:
-                            if field != "non_field_errors":
-                                message = f"{field}: {msg}"
-                            else:
-                                message = msg
-                            break
-
-                    return Response(
-                        {"error": f"Row {row_idx}: {message}"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+        # Validate every line, then resolve all users in one query
+        results, records = [], {}
+        for line, item in enumerate(items, start=1):
+            if item == b"":
+                continue  # blank NDJSON line
+            result = {"line": line}
+            try:
+                if isinstance(item, bytes):
+                    try:
+                        item = json.loads(item)
+                    except ValueError:
+                        raise ValueError("Invalid JSON.")
+                records[line] = bulk_record(item)
+            except ValueError as e:
+                result.update(status="error", error=str(e))
+            results.append(result)
+
+        users = resolve_users({user_id for user_id, _ in records.values()})
+        for result in results:
+            if result["line"] not in records:
+                continue
+            user_id, record = records[result["line"]]
+            if user_id in users:
+                record.user = users[user_id]
+            else:
+                del records[result["line"]]
+                result.update(status="error", error="User not found.")
 
-                user = serializer.save()
+        # Newest wins, in the batch (first of equals) and against stored records
+        winners = {}
+        for line, (_, record) in records.items():
+            pair = (record.user_id, record.training_id)
+            if pair not in winners or records[winners[pair]][1].timestamp < record.timestamp:
+                winners[pair] = line
+        written = writer.run(
+            TrainingRecord.objects.upsert_latest, [record for _, record in records.values()]
+        )
 
-                date = parse_to_aware_datetime(date)
-                if not date:
-                    transaction.set_rollback(True)
-                    return Response(
-                        {"error": f"Row {row_idx}: Invalid date"},
-                        status=status.HTTP_400_BAD_REQUEST,
+        counts = {"created": 0, "updated": 0, "skipped": 0, "error": 0}
+        for result in results:
+            if result["line"] in records:
+                _, record = records[result["line"]]
+                pair = (record.user_id, record.training_id)
+                if winners[pair] == result["line"] and pair in written:
+                    action = "created" if written[pair] == record.id else "updated"
+                    result.update(status=action, id=str(written[pair]))
+                else:
+                    result.update(status="skipped")
+            counts[result["status"]] += 1
+
+        imported = defaultdict(Counter)  # training ID -> {"created": n, "updated": n}
+        for result in results:
+            if result["status"] in ("created", "updated"):
+                imported[records[result["line"]][1].training_id][result["status"]] += 1
+        for training_id, changes in imported.items():
+            audit.record(request.user, "IMPORT", "training", [training_id], changes)
+
+        response = {**counts, "results": results}
+        if key:
+            writer.run(
+                IdempotencyKey.objects.store, request.user, key, digest.hexdigest(), response
+            )
+        return Response(response)
+
+    def save_rows(self, batches):
+        """
+        Create or rename users and upsert records for [(training, rows, error_prefix)]
+        in one transaction; nothing is written if any row fails.
+        """
+        records = []
+        users = resolve_users({row[1] for _, rows, _ in batches for row in rows})
+
+        with transaction.atomic():  # rollback everything if any row fails
+            for training, rows, prefix in batches:
+                for row_idx, user_id, name, date, details in rows:
+                    instance = users.get(user_id)
+
+                    serializer = UserRowSerializer(
+                        instance=instance,
+                        data={"id": user_id, "name": name},
+                        partial=True,
                     )
 
-                detail = {}
-                if training.type == "LMS":
-                    try:
-                        score = int(score)
-                    except Exception:
+                    if not serializer.is_valid():
                         transaction.set_rollback(True)
+
+                        # Show first error message
+                        message = ""
+                        for field, messages in serializer.errors.items():
+                            for msg in messages:
+                                if field != "non_field_errors":
+                                    message = f"{field}: {msg}"
+                                else:
+                                    message = msg
+                                break
+
                         return Response(
-                            {"error": f"Row {row_idx}: Invalid score value"},
+                            {"error": f"{prefix}Row {row_idx}: {message}"},
                             status=status.HTTP_400_BAD_REQUEST,
                         )
-                    detail = {"score": score}
 
-                existing = TrainingRecord.objects.filter(user=user, training=training).first()
-                if not existing:
-                    TrainingRecord.objects.create(
-                        user=user, training=training, timestamp=date, details=detail
+                    user = users[user_id] = serializer.save()
+                    records.append(
+                        TrainingRecord(
+                            user=user, training=training, timestamp=date, details=details
+                        )
                     )
-                elif existing.timestamp < date:
-                    existing.timestamp = date
-                    existing.details = detail
-                    existing.save()
-                # else: ignore if stored is equally new or newer
+
+            # Insert new records and replace older ones in bulk;
+            # stored records that are equally new or newer are kept
+            TrainingRecord.objects.upsert_latest(records)
 
         return Response()
 
@@ -220,18 +381,32 @@ class TrainingRecordViewSet(viewsets.GenericViewSet):
         record = self.get_object()
         serializer = TrainingRecordPatchSerializer(record, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        updated_record = serializer.save()
+        changes = diff(record, serializer.validated_data)
+        updated_record = writer.run(serializer.save)
+        audit.record(request.user, "UPDATE", "record", [record.id], changes)
         read_serializer = TrainingRecordReadSerializer(updated_record)
         return Response(read_serializer.data, status=status.HTTP_200_OK)
 
     # GET /training-records/{id}
     def retrieve(self, request, pk=None):
-        record = self.get_object()
-        serializer = TrainingRecordReadSerializer(record)
+        kw = dynamic_fields(request)
+        qs = TrainingRecordReadSerializer.prepare_queryset(TrainingRecord.objects.all(), **kw)
+        try:
+            record = self.get_object(qs)
+        except Http404:
+            archived = None
+            if wants_archived(request):
+                archived = ArchivedTrainingRecord.objects.filter(pk=pk).first()
+            if archived is None:
+                raise
+            record = archived.to_record()
+        serializer = TrainingRecordReadSerializer(record, **kw)
         return Response(serializer.data)
 
     # DELETE /training-records/{id}
     def destroy(self, request, pk=None):
         record = self.get_object()
-        record.delete()
+        record_id = record.id
+        writer.run(record.delete)
+        audit.record(request.user, "DELETE", "record", [record_id])
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,19 +1,27 @@
 # core/views/trainings.py
+from uuid import UUID
+
 from django.http import Http404
-from django.db.models import Prefetch
-from core.utils import paginate_qs
+from django.db.models import Prefetch, Q
+from core.utils import list_response, paginate_qs
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.audit import audit, diff
 from core.models import Training, User, TrainingRecord
 from core.serializers.trainings import (
     TrainingSerializer,
+    TrainingListSerializer,
     TrainingCreateSerializer,
     TrainingUpdateSerializer,
     TrainingUserStatusSerializer,
 )
+from core.serializers.dynamic import dynamic_fields
 from core.permissions import IsAdmin
+from core.deadlines import query_deadline
+from core.singleflight import single_flight
+from core.writer import writer
 
 
 class TrainingViewSet(viewsets.GenericViewSet):
@@ -41,6 +49,8 @@ class TrainingViewSet(viewsets.GenericViewSet):
     # ---------- users for a training (with completion_status) ----------
     # GET /api/trainings/{id}/users
     @action(detail=True, methods=["get"], url_path="users")
+    @single_flight()
+    @query_deadline()
     def users(self, request, pk=None):
         training = self.get_object()
 
@@ -73,8 +83,8 @@ class TrainingViewSet(viewsets.GenericViewSet):
             if not records:
                 completion_status = "PENDING"
             else:
-                # Assume only one record per user-training pair
-                # Currently we only store one latest record per user-training
+                # Only one (latest) record per user-training pair is stored,
+                # enforced by the unique constraint on TrainingRecord
                 record = records[0]
                 completion_status = record.status
             if status_filter:
@@ -90,7 +100,8 @@ class TrainingViewSet(viewsets.GenericViewSet):
     def create(self, request):
         serializer = TrainingCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        training = serializer.save()
+        training = writer.run(serializer.save)
+        audit.record(request.user, "CREATE", "training", [training.id], serializer.validated_data)
         # prefetch for consistent payload shape if client reads immediately
         training = Training.objects.prefetch_related("groups").get(id=training.id)
         return Response(TrainingSerializer(training).data, status=status.HTTP_201_CREATED)
@@ -98,23 +109,46 @@ class TrainingViewSet(viewsets.GenericViewSet):
     # GET /api/trainings/{id}
     def retrieve(self, request, *args, **kwargs):
         training_id = self.kwargs.get("pk")
-        training = Training.objects.filter(id=training_id).first()
+        kw = dynamic_fields(request)
+        qs = TrainingSerializer.prepare_queryset(Training.objects.all(), **kw)
+        training = qs.filter(id=training_id).first()
         if not training:
             raise Http404
-        return Response(TrainingSerializer(training).data)
+        return Response(TrainingSerializer(training, **kw).data)
 
-    # GET /api/trainings  (paginated if configured)
+    # GET /api/trainings  (paginated when page / page_size is given)
+    @single_flight()
+    @query_deadline()
     def list(self, request):
+        params = request.query_params
+        kw = dynamic_fields(request)
         qs = Training.objects.all()
-        ser = TrainingSerializer(qs, many=True)
-        return Response(ser.data)
+
+        training_type = params.get("type")
+        if training_type:
+            qs = qs.filter(type=training_type)
+        group = params.get("group")
+        if group:
+            try:
+                qs = qs.filter(groups__id=UUID(group))
+            except ValueError:
+                return Response({"error": "Invalid group"}, status=400)
+        search = params.get("search")
+        if search:
+            for keyword in search.split():
+                qs = qs.filter(Q(name__icontains=keyword) | Q(description__icontains=keyword))
+
+        sortable = {"name", "type", "timestamp", "expiry"}
+        return list_response(qs, params, kw, TrainingListSerializer, sortable, Response)
 
     # PATCH /api/trainings/{id}
     def partial_update(self, request, *args, **kwargs):
         training = self.get_object()
         serializer = TrainingUpdateSerializer(instance=training, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        changes = diff(training, serializer.validated_data)
+        writer.run(serializer.save)
+        audit.record(request.user, "UPDATE", "training", [training.id], changes)
         # return with groups embedded
         training = Training.objects.prefetch_related("groups").get(id=training.id)
         return Response(TrainingSerializer(training).data)
@@ -122,5 +156,7 @@ class TrainingViewSet(viewsets.GenericViewSet):
     # DELETE /api/trainings/{id}
     def destroy(self, request, *args, **kwargs):
         training = self.get_object()
-        training.delete()
+        training_id = training.id
+        writer.run(training.delete)
+        audit.record(request.user, "DELETE", "training", [training_id])
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -4,8 +4,13 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from core.models import User, UserAlias
-from core.models import Training, TrainingRecord
+from core.models import User
+from core.aliases import aliases, resolve_users
+from core.audit import audit, diff
+from core.models import TrainingRecordHistory
+from core.catalog import catalog
+from core.compliance import compliance_matrix
+from core.serializers.records import TrainingRecordHistorySerializer
 from core.serializers.users import (
     UserSerializer,
     UserCreateSerializer,
@@ -14,10 +19,13 @@ from core.serializers.users import (
     UserAliasDeleteSerializer,
     UserRowSerializer,
 )
+from core.serializers.dynamic import dynamic_fields
 from core.permissions import IsAuthenticated, IsAdmin
 
 from core.utils import NAME_COL, UID_COL
-from core.utils import parse_csv, parse_xlsx
+from core.utils import paginate_qs, parse_csv, parse_xlsx
+from core.deadlines import query_deadline
+from core.writer import writer
 
 
 class UserViewSet(viewsets.GenericViewSet):
@@ -26,24 +34,25 @@ class UserViewSet(viewsets.GenericViewSet):
     def get_object(self):
         pk = self.kwargs.get("pk")
         try:
-            alias = UserAlias.objects.get(id=pk)
-        except UserAlias.DoesNotExist:
+            return User.objects.get(pk=aliases.resolve(pk))
+        except User.DoesNotExist:
             raise Http404
-        return alias.user
 
     # POST /users
     def create(self, request):
         serializer = UserCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        user = writer.run(serializer.save)
+        audit.record(request.user, "CREATE", "user", [user.id], serializer.validated_data)
         return Response(UserSerializer(user).data)
 
     # GET /users/{id}
     def retrieve(self, request, *args, **kwargs):
         user = self.get_object()
-        return Response(UserSerializer(user).data)
+        return Response(UserSerializer(user, **dynamic_fields(request)).data)
 
     # GET /users
+    @query_deadline()
     def list(self, request):
         qs = User.objects.all()
 
@@ -72,6 +81,9 @@ class UserViewSet(viewsets.GenericViewSet):
             return Response({"error": "Invalid order_by field"}, status=400)
         qs = qs.order_by(order_by)
 
+        kw = dynamic_fields(request)
+        qs = UserSerializer.prepare_queryset(qs, **kw)
+
         # Pagination
         try:
             page = int(request.query_params.get("page", "1"))
@@ -84,7 +96,7 @@ class UserViewSet(viewsets.GenericViewSet):
         total_pages = (total_items + page_size - 1) // page_size
         start = (page - 1) * page_size
         end = start + page_size
-        items = [UserSerializer(u).data for u in qs[start:end]]
+        items = UserSerializer(qs[start:end], many=True, **kw).data
 
         return Response(
             {
@@ -101,7 +113,9 @@ class UserViewSet(viewsets.GenericViewSet):
         user = self.get_object()
         serializer = UserUpdateSerializer(instance=user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        user_id, changes = user.id, diff(user, serializer.validated_data)
+        writer.run(serializer.save)
+        audit.record(request.user, "UPDATE", "user", [user_id], changes)
         return Response(UserSerializer(user).data)
 
     # DELETE /users/{id}
@@ -112,7 +126,9 @@ class UserViewSet(viewsets.GenericViewSet):
                 {"error": "Cannot delete current user"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        user.delete()
+        user_id = user.id
+        writer.run(user.delete)
+        audit.record(request.user, "DELETE", "user", [user_id])
         return Response()
 
     # GET /users/me
@@ -123,7 +139,7 @@ class UserViewSet(viewsets.GenericViewSet):
         permission_classes=[IsAuthenticated],
     )
     def me(self, request):
-        return Response(UserSerializer(request.user).data)
+        return Response(UserSerializer(request.user, **dynamic_fields(request)).data)
 
     # POST /users/{id}/aliases
     # DELETE /users/{id}/aliases
@@ -137,7 +153,10 @@ class UserViewSet(viewsets.GenericViewSet):
         )
         serializer = serializer_class(instance=user, data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        writer.run(serializer.save)
+        alias_id = serializer.validated_data["id"]
+        action = "CREATE" if request.method == "POST" else "DELETE"
+        audit.record(request.user, action, "alias", [alias_id], {"user": user.id})
         return Response(UserSerializer(user).data)
 
     # POST /users/batch
@@ -176,41 +195,56 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        created = []
-
-        with transaction.atomic():  # rollback everything if any row fails
-            for row_idx, user_id, name in rows:
-                alias = UserAlias.objects.filter(id=user_id).first()
-                instance = alias.user if alias else None
-
-                serializer = UserRowSerializer(
-                    instance=instance,
-                    data={"id": user_id, "name": name},
-                    partial=True,
-                )
-
-                if not serializer.is_valid():
-                    transaction.set_rollback(True)
-
-                    # Show first error message
-                    message = ""
-                    for field, messages in serializer.errors.items():
-                        for msg in messages:
-                            if field != "non_field_errors":
-                                message = f"{field}: {msg}"
-                            else:
-                                message = msg
-                            break
-
-                    return Response(
-                        {"error": f"Row {row_idx}: {message}"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
+        changes = {}  # user ID -> audited changes
 
-                user = serializer.save()
-                created.append(user)
+        def save_users():
+            created = []
+            users = resolve_users({row[1] for row in rows})
 
-        return Response(UserSerializer(created, many=True).data)
+            with transaction.atomic():  # rollback everything if any row fails
+                for row_idx, user_id, name in rows:
+                    instance = users.get(user_id)
+
+                    serializer = UserRowSerializer(
+                        instance=instance,
+                        data={"id": user_id, "name": name},
+                        partial=True,
+                    )
+
+                    if not serializer.is_valid():
+                        transaction.set_rollback(True)
+
+                        # Show first error message
+                        message = ""
+                        for field, messages in serializer.errors.items():
+                            for msg in messages:
+                                if field != "non_field_errors":
+                                    message = f"{field}: {msg}"
+                                else:
+                                    message = msg
+                                break
+
+                        return Response(
+                            {"error": f"Row {row_idx}: {message}"},
+                            status=status.HTTP_400_BAD_REQUEST,
+                        )
+
+                    if instance is None:
+                        change = ("CREATE", serializer.validated_data)
+                    else:
+                        change = ("UPDATE", diff(instance, serializer.validated_data))
+                    user = users[user_id] = serializer.save()
+                    changes.setdefault(user.id, change)
+                    created.append(user)
+
+            return Response(UserSerializer(created, many=True).data)
+
+        response = writer.run(save_users)
+        if response.status_code == status.HTTP_200_OK:
+            for user_id, (action, change) in changes.items():
+                if change:
+                    audit.record(request.user, action, "user", [user_id], change)
+        return response
 
     # GET /users/{id}/trainings
     @action(detail=True, methods=["get"], url_path="trainings")
@@ -220,22 +254,32 @@ class UserViewSet(viewsets.GenericViewSet):
         """
         user = self.get_object()
 
-        # Trainings linked to any group that the user belongs to
-        user_group_ids = user.groups.values_list("id", flat=True)
-        trainings = (
-            Training.objects.filter(groups__id__in=user_group_ids)
-            .distinct()
-            .prefetch_related("groups")
-            .order_by("name")
-        )
+        # Trainings linked to any group that the user belongs to, with all statuses
+        # computed from one records query
+        trainings, cells = compliance_matrix([user.id])
+        results = [
+            {"training": training.id, "status": cells[user.id, training.id]}
+            for training in trainings
+        ]
 
-        results = []
+        return Response(results)
 
-        for training in trainings:
-            record = TrainingRecord.objects.filter(user=user, training=training).first()
-            if not record:
-                results.append({"training": training.id, "status": "PENDING"})
-            else:
-                results.append({"training": training.id, "status": record.status})
+    # GET /users/{id}/trainings/{training_id}/history
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"trainings/(?P<training_id>[^/.]+)/history",
+    )
+    def training_history(self, request, training_id=None, *args, **kwargs):
+        """
+        Every record ever written for this user and training, newest first.
+        """
+        user = self.get_object()
+        training = catalog.get(training_id)
+        if training is None:
+            raise Http404
 
-        return Response(results)
+        qs = TrainingRecordHistory.objects.filter(user=user, training=training).order_by(
+            "-timestamp"
+        )
+        return paginate_qs(qs, request.query_params, 20, TrainingRecordHistorySerializer, Response)
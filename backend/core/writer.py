@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.exceptions import APIException
+
+
+class WriteQueueTimeout(APIException):
+    status_code = 503
+    default_detail = "The server is busy writing, please try again."
+    default_code = "write_timeout"
+
+
+class WriteQueue:
+    """
+    Funnels database writes of this process through one writer thread.
+
+    writer.run(fn, *args) queues fn and blocks until it has run and been committed.
+    The writer takes everything queued at once (up to WRITE_QUEUE_BATCH jobs) and runs it
+    in a single transaction, each job in its own savepoint (group commit): many small
+    writes share one fsync, and SQLite never sees two writers from the same process.
+
+    Jobs that have not started within WRITE_QUEUE_TIMEOUT seconds are dropped and the
+    caller gets a 503. Only the write itself should be queued; parse and validate first.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _start(self):
+        # Threads do not survive fork(), so each (pre-forked) worker starts its own
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._queue = queue.SimpleQueue()
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def run(self, fn, *args, **kwargs):
+        # Run inline when disabled, on the writer itself, or inside a caller's transaction
+        if (
+            not settings.WRITE_QUEUE
+            or threading.current_thread() is self._thread
+            or connection.in_atomic_block
+        ):
+            return fn(*args, **kwargs)
+
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self._start()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        try:
+            return future.result(timeout=settings.WRITE_QUEUE_TIMEOUT)
+        except TimeoutError:
+            if future.cancel():
+                self.stats["timeouts"] += 1
+                raise WriteQueueTimeout()
+            return future.result()  # already running, it will finish shortly
+
+    def _loop(self):
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < settings.WRITE_QUEUE_BATCH:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            jobs = [job for job in jobs if job[0].set_running_or_notify_cancel()]
+            if jobs:
+                self._commit(jobs)
+
+    def _commit(self, jobs):
+        results = []
+        try:
+            with transaction.atomic():
+                for future, fn, args, kwargs in jobs:
+                    try:
+                        with transaction.atomic():  # a failing job only undoes its own writes
+                            results.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+        except Exception as e:  # the commit failed, nothing was written
+            results = [(future, None, e) for future, *_ in jobs]
+
+        # Callers are released only after the commit, so they read their own writes
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        self.stats["jobs"] += len(jobs)
+        self.stats["transactions"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(jobs))
+
+
+writer = WriteQueue()
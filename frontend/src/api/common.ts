@@ -144,6 +144,22 @@ export function del<T>(path: string, params: Record<string, any> = {}) {
   return request<T>("DELETE", path, params);
 }
 
+// --------------------
+// Columnar responses (?format=columnar)
+// --------------------
+
+export type Columnar<T> = { [K in keyof T]: T[K][] };
+
+export function fromColumnar<T>(columns: Columnar<T>): T[] {
+  const keys = Object.keys(columns) as (keyof T)[];
+  const length = keys.length ? columns[keys[0]].length : 0;
+  return Array.from({ length }, (_, i) => {
+    const row = {} as T;
+    for (const key of keys) row[key] = columns[key][i];
+    return row;
+  });
+}
+
 // --------------------
 // SWR helpers
 // --------------------
@@ -1,5 +1,5 @@
 import * as api from "@/api/common";
-import { swr } from "@/api/common";
+import { Columnar, fromColumnar, swr } from "@/api/common";
 
 export interface TrainingRecord {
   id: string;
@@ -75,8 +75,14 @@ export function listTrainingRecords({
 
   params.page = page;
   params.page_size = page_size;
-
-  let { data, error, isLoading } = swr<ListTrainingRecordResponse>("/api/training-records", params);
+  params.format = "columnar"; // smaller payload for large pages
+
+  const res = swr<Omit<ListTrainingRecordResponse, "items"> & { items: Columnar<TrainingRecord> }>(
+    "/api/training-records",
+    params,
+  );
+  const { error, isLoading } = res;
+  let data = res.data && { ...res.data, items: fromColumnar(res.data.items) };
 
   if (!data || error || isLoading) {
     data = {